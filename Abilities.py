@@ -59,6 +59,13 @@ class ActivatedAbility:
         if len([eff for eff in effects if eff.can_be_done(state)]) == 0:
             return None  # no valid way to choose effects
         # if reached here, ability can be done!  build a caster for it
+        return self.build_caster(state, player, source)
+
+    def build_caster(self, state: GameState, player: int,
+                     source: Cardboard) -> Verbs.PlayAbility:
+        """Builds the PlayAbility Verb for this ability, WITHOUT
+        checking whether it can actually be activated. Use
+        `valid_caster` unless that's already known."""
         stack_obj = Stack.StackAbility(controller=player, obj=self,
                                        pay_cost=None, do_effect=None)
         # figure out which verb can be used to cast this object
@@ -418,6 +425,8 @@ class GrantKeyword(ContinousEffect):
 # # -----------------------------------------------------------------------
 
 class Holder:
+    __slots__ = ("source", "controller", "effect", "duration", "target")
+
     def __init__(self, source: Cardboard, controller: int,
                  effect: ContinousEffect | TriggeredAbility | TimedAbility,
                  duration: Tuple[int, Times.Phase] | Get.GetBool | None,
@@ -491,6 +500,8 @@ class ActiveAbilityHolder(Holder):
     """Holds active abilities (static, triggered, timed) in the
     GameState tracking lists"""
 
+    __slots__ = ()
+
     def copy(self, state: GameState):
         return ActiveAbilityHolder(self.source.copy(state), self.controller,
                                    self.effect, self.duration,
@@ -503,12 +514,16 @@ class ActiveAbilityHolder(Holder):
             return False
         else:
             self.effect.temporarily_ignore = True
+            # Getters called meanwhile must not use or fill the getter cache,
+            # since they're answering as if this effect didn't exist.
+            state.num_ignored_effects += 1
             # the call to `match` may recursively call `is_applicable` on this
             # (or other) effects. however, the call to THIS effect will be
             # caught by the base case above, so there will not be an infinite
             # loop
             r = self.target.match(subject, state, self.controller, self.source)
             self.effect.temporarily_ignore = False  # reset to active status
+            state.num_ignored_effects -= 1
             return r
 
     def __str__(self):
@@ -522,6 +537,8 @@ class ActiveAbilityHolder(Holder):
 class TriggeredAbilityHolder(Holder):
     """Holds triggered abilities in the GameState tracking lists"""
 
+    __slots__ = ()
+
     def __init__(self, source: Cardboard, controller: int,
                  effect: TriggeredAbility,
                  duration: Tuple[int, Times.Phase] | Get.GetBool | None):
@@ -544,6 +561,8 @@ class TriggeredAbilityHolder(Holder):
 class TimedAbilityHolder(Holder):
     """Holds timed abilities in the GameState tracking lists"""
 
+    __slots__ = ()
+
     def __init__(self, source: Cardboard, controller: int,
                  effect: TimedAbility,
                  duration: Tuple[int, Times.Phase] | Get.GetBool | None):
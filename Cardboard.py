@@ -30,6 +30,10 @@ class Cardboard:
     # a list and I need the `in` functionality to use `is` rather than `==`.
     # Unfortunately, this also means I can't drop Cardboards into sets to sort.
 
+    # GameStates hold (and copy) a great many of these, so no __dict__.
+    __slots__ = ("rules_text", "tapped", "summon_sick", "counters",
+                 "owner_index", "zone", "hashed_value")
+
     def __init__(self, rules_text: RulesText):
         self.rules_text: RulesText = rules_text
         self.tapped: bool = False
@@ -40,6 +44,9 @@ class Cardboard:
         # who controls it, index of the player who ownes it, and its zone.
         self.owner_index = -1  # None?
         self.zone = Zone.Unknown()
+        # this card's contribution to the GameState's incremental hash, if
+        # the card is in a zone which the hash tracks. None otherwise.
+        self.hashed_value: int | None = None
 
     def __str__(self):
         s = self.rules_text.name
@@ -72,7 +79,8 @@ class Cardboard:
         it is not, returns a fresh copy of the card.
         Useful when copying spells on the stack."""
         if state_new is None:
-            new_card = Cardboard(self.rules_text)
+            # skip __init__, since every field is overwritten below anyway
+            new_card = Cardboard.__new__(Cardboard)
             # RulesText never mutates so it's ok that they're both pointing
             # at the same instance of a RulesText
             new_card.rules_text = self.rules_text
@@ -84,6 +92,7 @@ class Cardboard:
             new_card.counters = self.counters.copy()
             # zone can mutate, I think?  safer to copy not refer
             new_card.zone = self.zone.copy()
+            new_card.hashed_value = self.hashed_value
             return new_card
         else:
             assert self.zone.location is not None  # for debug
@@ -122,10 +131,10 @@ class Cardboard:
     def get_activated(self):
         return self.rules_text.activated
 
-    def get_id(self):
+    def get_id(self, ignore_tapped: bool = False):
         s = type(
             self.rules_text).__name__  # MtG card name (e.g. Wall of Roots)
-        if self.tapped:
+        if self.tapped and not ignore_tapped:
             s += "T"
         if self.summon_sick:
             s += "S"
@@ -134,6 +143,12 @@ class Cardboard:
             s += "[" + ",".join(self.counters) + "]"
         return s
 
+    def get_hash_value(self) -> int:
+        """The 64-bit value this card adds to the hash of the
+        GameState it is in. Depends only on `get_id`, so two
+        equivalent cards always give the same value."""
+        return hash(self.get_id()) & 0xFFFFFFFFFFFFFFFF
+
     def is_equiv_to(self, other):
         if not isinstance(other, Cardboard):
             return False
@@ -218,6 +233,13 @@ class Cardboard:
             if len([eff for eff in effects if eff.can_be_done(state)]) == 0:
                 return None  # no valid way to choose effects
         # if reached here, ability can be done!  build a caster for it
+        return self.build_caster(state)
+
+    def build_caster(self, state: GameState) -> PlayCardboard:
+        """Builds the PlayCardboard Verb for this card, WITHOUT
+        checking whether it can actually be cast. Use
+        `valid_caster` unless that's already known."""
+        player = self.player_index
         stack_obj = Stack.StackCardboard(controller=player, obj=self,
                                          pay_cost=None, do_effect=None)
         caster: PlayCardboard = self.rules_text.caster_verb()
@@ -329,6 +351,7 @@ class Cardboard:
 
 
 class CardNull(Cardboard):
+    __slots__ = ()
 
     def __init__(self):
         super().__init__(RulesText())
@@ -2,7 +2,7 @@ from __future__ import annotations
 from typing import TYPE_CHECKING, List
 
 from ManaHandler import ManaCost
-from Verbs import Verb, PayMana, MultiVerb, NullVerb
+from Verbs import Verb, PayMana, MultiVerb, NullVerb, AffectCard, AffectPlayer
 
 if TYPE_CHECKING:
     from GameState import GameState
@@ -28,6 +28,11 @@ class Cost:
             self.mana_value = 0
         else:
             self.mana_value = self.base_mana_cost.cmc()
+        # whether paying only looks at the source card and the paying player
+        # (tap the source, pay mana, use a land drop, etc). False if any other
+        # cards could matter, like for "tap another untapped creature".
+        self.is_self_contained = all([isinstance(v, (AffectCard, AffectPlayer))
+                                      for v in self.additional])
 
     def _get_multi_verb(self) -> Verb:
         if self.base_mana_cost is None:
@@ -5,9 +5,12 @@ Created on Mon Dec 28 21:13:59 2020
 @author: Cobi
 """
 from __future__ import annotations
-from typing import List, Tuple, Type, TYPE_CHECKING
+from typing import Dict, Iterator, List, Tuple, Type, TYPE_CHECKING
+from collections import Counter, OrderedDict
+from itertools import product
 
 if TYPE_CHECKING:
+    import Costs
     from Abilities import ActiveAbilityHolder
     from Abilities import TriggeredAbilityHolder, TimedAbilityHolder
 
@@ -16,12 +19,14 @@ import Getters as Get  # actually needs
 import Zone
 import Match2
 import Verbs
-from ManaHandler import ManaPool
+from ManaHandler import ManaPool, ManaPotential
 from Stack import StackObject
 from Verbs import MoveToZone, DrawCard, Untap, NullVerb
 import Pilots
 import Times
 
+HASH_MASK = 0xFFFFFFFFFFFFFFFF  # GameState hashes are 64-bit
+
 
 class GameState:
     """The current state of the game.
@@ -71,15 +76,100 @@ class GameState:
         # track static effects the same way we track triggers
         self.statics: List[ActiveAbilityHolder] = []
         self.statics_to_remove: List[ActiveAbilityHolder] = []
+        # cached indexes of the trigger and static lists above, by the type
+        # of Verb or Getter each holder listens for. see `_get_holder_index`.
+        self._holder_index: Dict[str, tuple] = {}
+        # incremental hash of all Cardboards in hands, fields, and graves.
+        # Sum (mod 2^64) of the `hashed_value` of each of those cards, kept
+        # up to date by the Player zone functions and by anything that
+        # changes a card in place (tap, untap, counters, etc).
+        self.card_hash: int = 0
+        # If True, Verbs with only one possible outcome are allowed to
+        # mutate this GameState instead of copying it. Whoever sets this is
+        # responsible for calling `checkpoint` beforehand and `rewind` after.
+        # NOT copied by copy_and_track, and NOT part of the ID or hash.
+        self.in_place_mode: bool = False
+        # sorting key of the mana ability which was just activated to reach
+        # this GameState, if that ability commutes with other mana abilities
+        # (see PlayManaAbility.get_commute_key). Commuting mana abilities
+        # with smaller keys are then skipped, since doing them in sorted
+        # order reaches all the same GameStates. NOT part of the ID or hash.
+        self.commute_key: str | None = None
+        # if not None, this GameState was already explored with a bigger
+        # commute_key, so ONLY the commuting mana abilities sorting before
+        # this limit still need to be tried. Set by the TranspositionTable.
+        self.commute_limit: str | None = None
+        # memoized Getter results, see `get_getter_cache`. `generation` is
+        # bumped by every change that could change what a Getter returns.
+        self.generation: int = 0
+        self._getter_cache: tuple | None = None
+        # number of static effects being temporarily ignored while checking
+        # whether they apply. Getters don't use the cache while this is > 0.
+        self.num_ignored_effects: int = 0
+        # the valid actions in GameStates seen so far (see `ActionCache`).
+        # Shared with every copy of this GameState, so one search shares
+        # one cache. NOT part of the ID or hash, and NOT pickled.
+        self.action_cache: ActionCache = ActionCache()
+        # whether each card can be cast or activated, keyed by the card and
+        # whatever its cost depends on (see `Player._caster_key`). Shared
+        # the same way as `action_cache`.
+        self.caster_cache: ActionCache = ActionCache()
 
     def __hash__(self):
-        return self.get_id().__hash__()  # hash the string of the get_id
+        # the cards are the expensive part, and they're hashed incrementally.
+        # everything else is a handful of ints, so just hash it here.
+        players = tuple([(p.victory_status, p.turn_count, p.life,
+                          p.num_lands_played, p.num_spells_cast,
+                          p.pool.data, p.deck_size)
+                         for p in self.player_list])
+        stack = tuple([obj.get_id() for obj in self.stack])
+        super_stack = tuple([obj.get_id() for obj in self.super_stack])
+        return hash((self.card_hash, players, self.active_player_index,
+                     self.priority_player_index, self.phase, stack,
+                     super_stack))
+
+    @staticmethod
+    def reset_caches(states: List[GameState]):
+        """MUTATES. Gives the GameStates new, empty ActionCaches,
+        shared between them (and all their future copies)."""
+        action_cache = ActionCache()
+        caster_cache = ActionCache()
+        for state in states:
+            state.action_cache = action_cache
+            state.caster_cache = caster_cache
+
+    def __getstate__(self):
+        # for pickling. the caches are only useful within this process
+        state_dict = self.__dict__.copy()
+        del state_dict["action_cache"]
+        del state_dict["caster_cache"]
+        return state_dict
+
+    def __setstate__(self, state_dict):
+        # for unpickling. str hashes can differ between processes, so the
+        # incremental hash of the cards needs to be rebuilt from scratch
+        self.__dict__.update(state_dict)
+        self.action_cache = ActionCache()
+        self.caster_cache = ActionCache()
+        for player in self.player_list:
+            for card in player.hand + player.field + player.grave:
+                card.hashed_value = card.get_hash_value()
+        self.card_hash = self.recompute_card_hash()
 
     def __neg__(self, other):
         return not self.__eq__(other)
 
     def __eq__(self, other):
-        return isinstance(other, GameState) and self.get_id() == other.get_id()
+        if not isinstance(other, GameState):
+            return NotImplemented  # let StateKey compare itself to us
+        # only build the full id strings if the hashes collide
+        return hash(self) == hash(other) and self.get_id() == other.get_id()
+
+    def get_key(self) -> StateKey:
+        """A frozen record of what this GameState is right now. It
+        hashes and compares equal to any GameState equal to this
+        one, but stays the same if this GameState is mutated."""
+        return StateKey(self)
 
     def __str__(self):
         txt = "\n".join([str(p) for p in self.player_list])
@@ -130,8 +220,14 @@ class GameState:
         state.phase = self.phase
         # copy history stuff
         state.is_tracking_history = self.is_tracking_history
-        state.previous_state = self if state.is_tracking_history else None
-        state.events_since_previous = ""
+        if self.in_place_mode and self.is_tracking_history:
+            # self is going to be mutated and rewound, so it can't be a link
+            # in the history chain. the copy takes over self's history instead
+            state.previous_state = self.previous_state
+            state.events_since_previous = self.events_since_previous
+        else:
+            state.previous_state = self if state.is_tracking_history else None
+            state.events_since_previous = ""
         # now copy the stack and superstack, which are made of StackObjects.
         # Need to append as I go, in case of pointers to StackObjects, so
         # I can't use list comprehensions. Must use a loop. I tried. --Cobi.
@@ -148,6 +244,11 @@ class GameState:
         state.statics = [h.copy(state) for h in self.statics]
         state.statics_to_remove = [h.copy(state)
                                    for h in self.statics_to_remove]
+        # cards were copied along with their hashed_values, so hash matches
+        state.card_hash = self.card_hash
+        state.commute_key = self.commute_key
+        state.action_cache = self.action_cache
+        state.caster_cache = self.caster_cache
         # return!
         return state, new_track_list
 
@@ -177,6 +278,152 @@ class GameState:
     def copy(self) -> GameState:
         return self.copy_and_track([])[0]
 
+    def copy_or_reuse(self, track_list: list | tuple, num_branches: int
+                      ) -> Tuple[GameState, list | tuple]:
+        """For Verbs which copy the GameState once per possible
+        outcome. If this GameState is in `in_place_mode` and there
+        is only one outcome, returns this GameState and the
+        track_list unchanged, to be mutated directly. Otherwise
+        same as `copy_and_track`."""
+        if self.in_place_mode and num_branches == 1:
+            return self, list(track_list)
+        else:
+            return self.copy_and_track(track_list)
+
+    def checkpoint(self) -> tuple:
+        """Returns an undo record of everything about this
+        GameState that a Verb might mutate. Pass it to `rewind`
+        to put the GameState back the way it is now. Much cheaper
+        than `copy`, since no Cardboards, Zones, or holders are
+        built, only lists of pointers to the existing ones.
+        The same record can be rewound to any number of times."""
+        players = []
+        cards = []
+        for p in self.player_list:
+            # the deck is copy-on-write, so marking it as shared means that
+            # the saved list can't be mutated by anyone.
+            p._deck_is_shared = True
+            players.append((p, p.turn_count, p.life, p.num_lands_played,
+                            p.num_spells_cast, p.pool.copy(),
+                            p.victory_status, p.hand[:], p.field[:],
+                            p.grave[:], p._deck, p.copy_aggregates()))
+            for c in p.hand + p.field + p.grave:
+                cards.append((c, c.tapped, c.summon_sick, c.counters, c.zone,
+                              c.zone.location, c.hashed_value))
+        stack_objs = []
+        for obj in self.stack:
+            stack_objs.append((obj, obj.zone, obj.zone.location))
+            if isinstance(obj.obj, Cardboard):
+                c = obj.obj
+                cards.append((c, c.tapped, c.summon_sick, c.counters, c.zone,
+                              c.zone.location, c.hashed_value))
+        return (players, cards, stack_objs, self.stack[:],
+                self.super_stack[:], self.active_player_index,
+                self.priority_player_index, self.phase, self.card_hash,
+                self.events_since_previous, self.trig_timed[:],
+                self.trig_event[:], self.trigs_to_remove[:],
+                self.statics[:], self.statics_to_remove[:], self.commute_key,
+                self.commute_limit)
+
+    def rewind(self, record: tuple):
+        """MUTATES. Undoes all changes made to this GameState
+        since `checkpoint` returned the given record."""
+        (players, cards, stack_objs, stack, super_stack, active, priority,
+         phase, card_hash, events, trig_timed, trig_event, trigs_to_remove,
+         statics, statics_to_remove, commute_key, commute_limit) = record
+        for (p, turn, life, lands, spells, pool, victory, hand, field, grave,
+             deck, aggregates) in players:
+            p.turn_count = turn
+            p.life = life
+            p.num_lands_played = lands
+            p.num_spells_cast = spells
+            p.pool = pool.copy()  # copy, since pools mutate
+            p.victory_status = victory
+            p.hand = hand[:]  # copy lists too, so record can be reused
+            p.field = field[:]
+            p.grave = grave[:]
+            p._deck = deck
+            p._deck_is_shared = True
+            p.aggregates = {z: c.copy() for z, c in aggregates.items()}
+        for c, tapped, sick, counters, zone, location, hashed in cards:
+            c.tapped = tapped
+            c.summon_sick = sick
+            c.counters = counters  # never mutated in place, only replaced
+            c.zone = zone
+            zone.location = location
+            c.hashed_value = hashed
+        for obj, zone, location in stack_objs:
+            obj.zone = zone
+            zone.location = location
+        self.stack = stack[:]
+        self.super_stack = super_stack[:]
+        self.active_player_index = active
+        self.priority_player_index = priority
+        self.phase = phase
+        self.card_hash = card_hash
+        self.events_since_previous = events
+        self.trig_timed = trig_timed[:]
+        self.trig_event = trig_event[:]
+        self.trigs_to_remove = trigs_to_remove[:]
+        self.statics = statics[:]
+        self.statics_to_remove = statics_to_remove[:]
+        self.commute_key = commute_key
+        self.commute_limit = commute_limit
+        self.generation += 1
+
+    def get_getter_cache(self) -> dict:
+        """
+        Returns the dict for memoizing Getter results in this
+            GameState. See `Getter.get` for the keys. Emptied
+            whenever `generation` changes or the lists of static
+            effects change, since either might change the results.
+        """
+        cached = self._getter_cache
+        if (cached is not None and cached[0] == self.generation
+                and cached[1] is self.statics
+                and cached[2] is self.statics_to_remove
+                and cached[3] == (len(self.statics),
+                                  len(self.statics_to_remove))):
+            return cached[4]
+        cache = {}
+        self._getter_cache = (self.generation, self.statics,
+                              self.statics_to_remove,
+                              (len(self.statics), len(self.statics_to_remove)),
+                              cache)
+        return cache
+
+    def hash_card(self, card: Cardboard):
+        """MUTATES. Adds the card to the incremental hash. Call
+        when the card enters a hand, field, or graveyard."""
+        self.generation += 1
+        card.hashed_value = card.get_hash_value()
+        self.card_hash = (self.card_hash + card.hashed_value) & HASH_MASK
+
+    def unhash_card(self, card: Cardboard):
+        """MUTATES. Removes the card from the incremental hash.
+        Call when the card leaves a hand, field, or graveyard."""
+        if card.hashed_value is not None:
+            self.generation += 1
+            self.card_hash = (self.card_hash - card.hashed_value) & HASH_MASK
+            card.hashed_value = None
+
+    def rehash_card(self, card: Cardboard):
+        """MUTATES. Call after changing a card in place (tapping
+        it, adding counters, etc) to keep the incremental hash up
+        to date. Does nothing for cards the hash isn't tracking."""
+        if card.hashed_value is not None:
+            self.unhash_card(card)
+            self.hash_card(card)
+
+    def recompute_card_hash(self) -> int:
+        """Returns the value `card_hash` should have, built
+        from scratch. Slow. Useful for debugging."""
+        total = 0
+        for player in self.player_list:
+            for card in player.hand + player.field + player.grave:
+                total += card.get_hash_value()
+        return total & HASH_MASK
+
     def get_all_history(self):
         text = ""
         if self.previous_state is not None:
@@ -246,6 +493,7 @@ class GameState:
             for card in player.field:
                 # erase the invisible counters
                 card.counters = [c for c in card.counters if c[0] not in "@$"]
+                self.rehash_card(card)
         # add tracker message, if applicable
         if self.is_tracking_history:
             message = "Pass>>Player%i Turn%i" % (self.active_player_index,
@@ -363,6 +611,57 @@ class GameState:
                 # a player who wants to do an action now has priority. return.
                 return [self]
 
+    def get_priority_actions(self) -> List[Verbs.Verb]:
+        """
+        Returns the list of actions that the player with priority
+            wants to try. Each is a caster Verb, or NullVerb for
+            passing priority.
+        This function expects that the superstack is empty.
+        """
+        # sometimes the player has already stated that they don't want to act
+        # at this point in time. If so, just pass priority immediately
+        if len(self.stack) > 0 and not self.priority.want_to_respond:
+            return [NullVerb()]
+        if len(self.stack) == 0 and not self.priority.want_to_act:
+            return [NullVerb()]
+        # options are: cast spell; activate ability; pass priority
+        activables = self.priority.get_valid_activations()
+        castables = self.priority.get_valid_castables()
+        if (self.priority.pilot.skip_useless_mana
+                and not self.priority.could_use_more_mana()):
+            activables = [a for a in activables
+                          if not isinstance(a, Verbs.PlayManaAbility)]
+        if self.priority.pilot.auto_tap:
+            auto_castables = self.priority.get_auto_tap_castables()
+            if auto_castables is not None:
+                castables = auto_castables
+                # mana abilities only get activated to cast something,
+                # unless some other ability needs mana to pay for it
+                if not self.priority.has_mana_costed_abilities():
+                    activables = [a for a in activables
+                                  if not isinstance(a, Verbs.PlayManaAbility)]
+        opts = activables + castables
+        chosen = self.priority.pilot.choose_action_to_take(opts)
+        if self.commute_key is not None or self.commute_limit is not None:
+            # only do commuting mana abilities in sorted order
+            chosen = [v for v in chosen if self._is_in_commute_range(v)]
+        return chosen
+
+    def _is_in_commute_range(self, to_do: Verbs.Verb) -> bool:
+        """Whether the action still needs to be tried, given the
+        `commute_key` and `commute_limit` of this GameState."""
+        key = GameState._get_commute_key(to_do, self)
+        if key is None:
+            return self.commute_limit is None
+        return ((self.commute_key is None or key >= self.commute_key)
+                and (self.commute_limit is None or key < self.commute_limit))
+
+    @staticmethod
+    def _get_commute_key(to_do: Verbs.Verb, state: GameState) -> str | None:
+        if isinstance(to_do, Verbs.PlayManaAbility):
+            return to_do.get_commute_key(state)
+        return None
+
     def do_priority_action(self) -> List[GameState]:
         """
         The player with priority chooses a single valid action to
@@ -378,35 +677,81 @@ class GameState:
             from the original gamestate, if no player wants
             priority within this phase and the stack is empty.
         """
-        # sometimes the player has already stated that they don't want to act
-        # at this point in time. If so, just pass priority immediately
-        if len(self.stack) > 0 and not self.priority.want_to_respond:
-            return self.copy().pass_priority()
-        if len(self.stack) == 0 and not self.priority.want_to_act:
-            return self.copy().pass_priority()
-        # options are: cast spell; activate ability; pass priority
-        activables = self.priority.get_valid_activations()
-        castables = self.priority.get_valid_castables()
-        opts = activables + castables
         state_list: List[GameState] = []
-        for to_do in self.priority.pilot.choose_action_to_take(opts):
-            if isinstance(to_do, NullVerb):
-                # pass priority
-                state_list += self.copy().pass_priority()
-            else:
-                # player chose an actual action to do. do it!
-                if to_do.copies:
-                    results = to_do.do_it(self)
-                else:
-                    new_state, [new_caster] = self.copy_and_track([to_do])
-                    results = new_caster.do_it(new_state)
-                final_results = []
-                for state3, _, _ in results:
-                    final_results += state3.clear_super_stack()
-                state_list += final_results
+        for to_do in self.get_priority_actions():
+            state_list += self.do_action(to_do)
         # return final results
         return state_list
 
+    def do_action(self, to_do: Verbs.Verb) -> List[GameState]:
+        """
+        Does one of the actions from `get_priority_actions`. Returns
+            a list of new GameStates where the action has been done
+            and the superstack cleared.
+        Does not mutate the calling GameState.
+        """
+        if isinstance(to_do, NullVerb):
+            # pass priority
+            results = self.copy().pass_priority()
+            for state3 in results:
+                state3.commute_key = None
+                state3.commute_limit = None
+            return results
+        # player chose an actual action to do. do it!
+        key = GameState._get_commute_key(to_do, self)
+        if to_do.copies:
+            results = to_do.do_it(self)
+        else:
+            new_state, [new_caster] = self.copy_and_track([to_do])
+            results = new_caster.do_it(new_state)
+        final_results = []
+        for state3, _, _ in results:
+            final_results += state3.clear_super_stack()
+        for state4 in final_results:
+            state4.commute_key = key
+            state4.commute_limit = None
+        return final_results
+
+    def do_priority_action_in_place(self) -> Iterator[List[GameState]]:
+        """
+        Same as `do_priority_action`, but rather than copying this
+            GameState for every action, it is put into `in_place_mode`
+            so that actions with only one possible outcome just
+            mutate it. Then it is rewound (see `checkpoint`) before
+            the next action is tried.
+        Yields one list of resulting GameStates per action. These
+            lists may include this GameState itself, and are only
+            valid until the next list is requested. Copy anything
+            worth keeping.
+        MUTATES, but this GameState is rewound to how it started
+            (and its `in_place_mode` restored) once the generator
+            is exhausted OR closed early, or if an action raises.
+        """
+        was_in_place = self.in_place_mode
+        self.in_place_mode = True
+        record = self.checkpoint()
+        try:
+            for to_do in self.get_priority_actions():
+                try:
+                    if isinstance(to_do, NullVerb):
+                        # pass priority. already clears the superstack.
+                        final_results = self.pass_priority()
+                        key = None
+                    else:
+                        key = GameState._get_commute_key(to_do, self)
+                        final_results = []
+                        for state3, _, _ in to_do.do_it(self):
+                            final_results += state3.clear_super_stack(
+                                may_mutate=True)
+                    for state4 in final_results:
+                        state4.commute_key = key
+                        state4.commute_limit = None
+                    yield final_results
+                finally:
+                    self.rewind(record)
+        finally:
+            self.in_place_mode = was_in_place
+
     # -------------------------------------------------------------------------
 
     def step_untap(self):
@@ -430,6 +775,7 @@ class GameState:
                                                 card, None)[0]
             untapper.do_it(self, check_triggers=True)
             card.summon_sick = False
+            self.rehash_card(card)
         self.is_tracking_history = was_tracking  # reset tracking to how it was
 
     def step_upkeep(self):
@@ -548,8 +894,9 @@ class GameState:
 
     def resolve_top_of_stack(self) -> List[GameState]:
         """
-        DOES NOT MUTATE. Instead, returns a list of GameStates in
-            which the top item of the stack has been resolved.
+        DOES NOT MUTATE (unless in `in_place_mode`). Instead, returns
+            a list of GameStates in which the top item of the stack
+            has been resolved.
         If it was a StackCardboard, the card has been moved to the
             appropriate zone. If it was a Spell specifically, the
             effect has been resolved. Any enter-the-battlefield
@@ -561,7 +908,7 @@ class GameState:
         All returned GameStates have empty SuperStacks."""
         if len(self.stack) == 0:
             return []
-        new_state = self.copy()
+        new_state = self.copy_or_reuse([], 1)[0]
         # remove StackObject from the stack
         obj = new_state.pop_from_stack(-1)
         if obj.do_effect is None:
@@ -581,7 +928,8 @@ class GameState:
         for tup in results:
             # active player recieves priority. Rule 117.3b
             tup[0].priority_player_index = tup[0].active_player_index
-            final_results += tup[0].clear_super_stack()
+            # all of these are already new states (or self, if in-place)
+            final_results += tup[0].clear_super_stack(may_mutate=True)
         return final_results
 
     def clear_super_stack(self, may_mutate=False) -> List[GameState]:
@@ -639,6 +987,13 @@ class GameState:
                       if caster.player == player]
             # only back to active player if super_stack==[]. breaks base case.
             assert player != state2.active_player_index
+        # interchangeable triggers give the same results whichever goes first,
+        # so only try the first of each kind. see get_interchange_key.
+        kinds = {}
+        for ii, caster in theirs:
+            kinds.setdefault(GameState._get_interchange_key(caster),
+                             (ii, caster))
+        theirs = list(kinds.values())
         # pick a super_stack caster to cast first.
         decider = state2.player_list[player].pilot
         for ii, v in decider.choose_exactly_one(theirs, "Put on stack"):
@@ -663,6 +1018,86 @@ class GameState:
             final_results += state.clear_super_stack()
         return final_results
 
+    @staticmethod
+    def _get_interchange_key(caster: Verbs.UniversalCaster) -> str:
+        if isinstance(caster, Verbs.AddTriggeredAbility):
+            return caster.get_interchange_key()
+        return caster.get_id()
+
+    def get_trigger_holders(self, verb: Verbs.Verb
+                            ) -> List[TriggeredAbilityHolder]:
+        """
+        Returns the holders in trig_event and trigs_to_remove
+            which could possibly be triggered by the given Verb,
+            in the same order as they are in those lists.
+        Holders are indexed by the Verb type they listen for, so
+            this only checks `verb.is_type` once per type rather
+            than once per holder.
+        """
+        index = self._get_holder_index("trigs", (self.trig_event,
+                                                 self.trigs_to_remove))
+        return [holder for _, holder in GameState._look_up(index, verb, -1)]
+
+    def get_static_holders(self, subject: Verbs.Verb | Get.Getter,
+                           after: int = -1
+                           ) -> List[Tuple[int, ActiveAbilityHolder]]:
+        """
+        Returns (position, holder) for each holder in statics and
+            statics_to_remove which could possibly apply to the
+            given Verb (replacement effects) or Getter (modifier
+            effects), in the same order as they are in those lists.
+            Only holders after the given position are returned.
+        Holders are indexed by the Verb type or Getter type they
+            listen for, so most Verbs and Getters find nothing.
+        """
+        index = self._get_holder_index("statics", (self.statics,
+                                                   self.statics_to_remove))
+        return GameState._look_up(index, subject, after)
+
+    @staticmethod
+    def _look_up(index: dict, subject: Verbs.Verb | Get.Getter, after: int
+                 ) -> list:
+        found = []
+        num_lists = 0
+        for key, holders in index.items():
+            # isinstance can't see sub-verbs, so use Verb.is_type instead
+            if key is None or (subject.is_type(key)
+                               if isinstance(subject, Verbs.Verb)
+                               else isinstance(subject, key)):
+                found += [pair for pair in holders if pair[0] > after]
+                num_lists += 1
+        if num_lists > 1:
+            found.sort(key=lambda pair: pair[0])  # back into list order
+        return found
+
+    def _get_holder_index(self, name: str, lists: tuple) -> dict:
+        """
+        Returns a dict from the Verb type or Getter type which
+            each holder in the given lists listens for, to the
+            (position, holder) pairs listening for it. Positions
+            count through the lists in order. Holders whose
+            pattern has no single type might match anything, so
+            they go under None.
+        Cached under `name`. Rebuilt whenever any of the lists is
+            replaced or changes length, so copy, rewind, etc. need
+            no extra bookkeeping.
+        """
+        lengths = tuple([len(lst) for lst in lists])
+        cached = self._holder_index.get(name)
+        if (cached is not None and cached[1] == lengths
+                and all([a is b for a, b in zip(cached[0], lists)])):
+            return cached[2]
+        index = {}
+        pos = 0
+        for lst in lists:
+            for holder in lst:
+                key = getattr(holder.target, "verb_type",
+                              getattr(holder.target, "getter_type", None))
+                index.setdefault(key, []).append((pos, holder))
+                pos += 1
+        self._holder_index[name] = (lists, lengths, index)
+        return index
+
     def state_based_actions(self):
         """MUTATES.
         Performs any state-based actions. Also clears any stale
@@ -708,6 +1143,89 @@ class GameState:
 # ---------------------------------------------------------------------------
 
 
+class ActionCache:
+    """
+    Remembers which actions were valid for each player in recently
+    seen GameStates, keyed by (hash of the GameState, player index).
+    Each entry also holds the ID of its GameState, so a different
+    GameState with the same hash is a miss rather than a hit.
+    Equivalent GameStates have their cards sorted identically, so
+    the valid actions are stored as positions rather than Verbs:
+    (zone name, index in zone, index of ability) for activated
+    abilities, and index in hand for castable cards. The caster
+    Verbs are rebuilt from these positions, which is much cheaper
+    than checking all the costs and targets again.
+    Each GameState has one, shared with all its copies. Use
+    `GameState.reset_caches` to give a search a fresh one.
+    Holds at most `max_size` entries, evicting the least-recently
+    used.
+    Also used to remember whether single cards can be cast or
+    activated, keyed by everything the card's cost depends on.
+    """
+
+    def __init__(self, max_size: int = 100000):
+        self.max_size: int = max_size
+        self._entries: OrderedDict[tuple, object] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: tuple, check=None):
+        """Returns the positions stored under the key, or None if
+        there are none or if they were stored with a different
+        `check` value (e.g. the ID of a different GameState)."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != check:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: tuple, positions, check=None):
+        """MUTATES. Stores the positions, evicting if full."""
+        self._entries[key] = (check, positions)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """MUTATES. Forgets everything."""
+        self._entries = OrderedDict()
+
+
+class StateKey:
+    """Stands in for a GameState in sets and dicts, for GameStates
+    which are about to be mutated (see `GameState.in_place_mode`).
+    Much cheaper than copying the GameState, but it can only be
+    compared and hashed, not played."""
+
+    __slots__ = ("_hash", "_id", "total_turns", "phase", "commute_key")
+
+    def __init__(self, state: GameState):
+        self._hash: int = hash(state)
+        self._id: str = state.get_id()
+        # duck-typed with GameState, for the TranspositionTable
+        self.total_turns: int = state.total_turns
+        self.phase: Times.Phase = state.phase
+        self.commute_key: str | None = state.commute_key
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if isinstance(other, StateKey):
+            return self._hash == other._hash and self._id == other._id
+        elif isinstance(other, GameState):
+            return self._hash == hash(other) and self._id == other.get_id()
+        return NotImplemented
+
+    def get_id(self):
+        return self._id
+
+
 class Player:
     def __init__(self, state: GameState,
                  pilot: Pilots.Pilot = Pilots.BotTriesAll()):
@@ -724,14 +1242,56 @@ class Player:
         self.pool: ManaPool = ManaPool("")
         self.victory_status: str = ""  # "Playing". can also be "W" or "L".
         # game zones
-        self.deck: List[Cardboard] = []  # list of Cardboard objects
+        self._deck: List[Cardboard] = []  # list of Cardboard objects
+        # True if _deck (and the Cardboards in it) may also belong to a copy
+        # of this Player. Don't touch _deck directly, use `deck`.
+        self._deck_is_shared: bool = False
         self.hand: List[Cardboard] = []  # list of Cardboard objects
         self.field: List[Cardboard] = []  # list of Cardboard objects
         self.grave: List[Cardboard] = []  # list of Cardboard objects
         # The following fields are NOT included in get_id
+        # cached `get_groups` results, by zone name. see there.
+        self._groups: Dict[str, tuple] = {}
+        # how many cards in the hand, field, and grave have each keyword,
+        # card type, and name. kept up to date by the zone functions below.
+        # see `Player.get_aggregate_keys`.
+        self.aggregates: Dict[str, Counter] = {"hand": Counter(),
+                                               "field": Counter(),
+                                               "grave": Counter()}
         # how the player makes decisions. ["try_all", "try_one", or "manual"]
         self.pilot: Pilots.Pilot = pilot
 
+    @property
+    def deck(self) -> List[Cardboard]:
+        """The Cardboards in the deck. A copied Player shares its
+        deck with the original, since the deck almost never changes
+        within a phase. Anyone asking for the deck might mutate it
+        (or the Cardboards in it), so that's when the shared deck
+        actually gets copied."""
+        if self._deck_is_shared:
+            self._deck = [c.copy() for c in self._deck]
+            self._deck_is_shared = False
+        return self._deck
+
+    @deck.setter
+    def deck(self, new_deck: List[Cardboard]):
+        self._deck = new_deck
+        self._deck_is_shared = False
+        self.gamestate.generation += 1
+
+    @property
+    def deck_view(self) -> Tuple[Cardboard, ...]:
+        """The Cardboards in the deck, for callers which only read
+        them. Doesn't force a shared deck to be copied, so neither
+        the tuple's order nor the Cardboards in it may be changed."""
+        return tuple(self._deck)
+
+    @property
+    def deck_size(self) -> int:
+        """Same as len(deck) but doesn't force a shared deck
+        to be copied."""
+        return len(self._deck)
+
     @property
     def is_my_turn(self):
         return self.player_index == self.gamestate.active_player_index
@@ -773,7 +1333,7 @@ class Player:
         txt += "(LOST)" if self.victory_status == "L" else ""
         txt += "  T:%2i" % self.turn_count
         txt += "  HP:%2i" % self.life
-        txt += "  Deck:%2i" % len(self.deck)
+        txt += "  Deck:%2i" % self.deck_size
         txt += "  Mana:(%6s)" % str(self.pool)
         if len(self.hand) > 0:
             txt += "\n  HAND:  " + ",".join([str(card) for card in self.hand])
@@ -793,7 +1353,7 @@ class Player:
         land = "land%i" % self.num_lands_played
         storm = "storm%i" % self.num_spells_cast
         pool = "(%s)" % str(self.pool)
-        deck = "deck%i" % len(self.deck)
+        deck = "deck%i" % self.deck_size
         hand = ",".join([c.get_id() for c in self.hand])
         field = ",".join([c.get_id() for c in self.field])
         grave = ",".join([c.get_id() for c in self.grave])
@@ -816,16 +1376,41 @@ class Player:
         new_player.pool = self.pool.copy()
         # copy victory status
         new_player.victory_status = self.victory_status
-        # for the lists of Cardboards (hand, deck, field, grave), spin
+        # for the lists of Cardboards (hand, field, grave), spin
         # through making copies as I go. The ordering will be maintained. Note
         # this doesn't supply a GameState to copy() because there should be
         # no pointers within any of these zones. they're real Cardboards.
         new_player.hand = [c.copy() for c in self.hand]
-        new_player.deck = [c.copy() for c in self.deck]
+        # the deck is copy-on-write instead. both players share it until
+        # one of them looks at it.
+        new_player._deck = self._deck
+        new_player._deck_is_shared = True
+        self._deck_is_shared = True
         new_player.field = [c.copy() for c in self.field]
         new_player.grave = [c.copy() for c in self.grave]
+        new_player.aggregates = self.copy_aggregates()
         return new_player
 
+    def copy_aggregates(self) -> Dict[str, Counter]:
+        return {zone: counts.copy()
+                for zone, counts in self.aggregates.items()}
+
+    @staticmethod
+    def get_aggregate_keys(card: Cardboard) -> set:
+        """
+        The keys under which the card is counted in `aggregates`.
+            Each key is (Getter type, value) for a characteristic
+            the card has: (Get.Keywords, "defender"), (Get.CardTypes,
+            "creature"), (Get.CardName, "Roots"), etc. Every card
+            also has the key (None, None), to count all cards.
+        These come from the printed card. Static effects might
+            change them, so check before trusting the counts.
+        """
+        rules = card.rules_text
+        return ({(Get.Keywords, kw) for kw in rules.keywords}
+                | {(Get.CardTypes, t) for t in rules.cardtypes}
+                | {(Get.CardName, rules.name), (None, None)})
+
 
     def get_valid_activations(self, hide_equivalent=True
                               ) -> List[Verbs.UniversalCaster]:
@@ -835,28 +1420,15 @@ class Player:
         Verbs, each of which will let the user choose payments
         and targets for that ability and put it onto the stack.
         """
-        activatables: List[Verbs.PlayAbility] = []
-        active_objects: List[Cardboard] = []  # I already checked these cards
-        game = self.gamestate
-        # temporarily set decision_maker to be "try_all", to see if ANY method
-        # of casting this card will work.
-        old_pilot = self.pilot
-        self.pilot = Pilots.BotTriesAll()
-        for source in self.hand + self.field + self.grave:
-            if (any([source.is_equiv_to(ob) for ob in active_objects])
-                    and hide_equivalent):
-                continue  # skip cards equivalent to those already searched
-            add_object = False
-            for ability in source.get_activated():
-                caster = ability.valid_caster(game, self.player_index, source)
-                if caster is not None:
-                    add_object = True
-                    activatables.append(caster)
-            # track object to not look at any similar again.
-            if add_object and hide_equivalent:
-                active_objects.append(source)
-        self.pilot = old_pilot  # reset pilot
-        return activatables
+        if not hide_equivalent:
+            return [caster for _, caster
+                    in self._find_valid_activations(hide_equivalent)]
+        positions = self._get_cached_positions()
+        if positions is None:
+            return self._cache_positions()[0]
+        return [getattr(self, zone)[ii].get_activated()[jj].build_caster(
+                    self.gamestate, self.player_index, getattr(self, zone)[ii])
+                for zone, ii, jj in positions[0]]
 
     def get_valid_castables(self, hide_equivalent=True
                             ) -> List[Verbs.UniversalCaster]:
@@ -866,27 +1438,435 @@ class Player:
         each of which will let the user choose payments and
         targets for that card and put it onto the stack.
         """
-        castables: List[Verbs.PlayCardboard] = []
-        active_objects: List[Cardboard] = []
+        if not hide_equivalent:
+            return [caster for _, caster
+                    in self._find_valid_castables(hide_equivalent)]
+        positions = self._get_cached_positions()
+        if positions is None:
+            return self._cache_positions()[1]
+        return [self.hand[ii].build_caster(self.gamestate)
+                for ii in positions[1]]
+
+    def get_mana_potential(self) -> ManaPotential | None:
+        """
+        The most mana this player could make right now with the
+        mana abilities of their permanents, without actually
+        activating any of them. Understands abilities which tap
+        their source, abilities usable once per turn, and abilities
+        which also tap another creature (like Caretaker), which
+        then can't tap for its own mana.
+        Returns None if some mana ability has a cost this doesn't
+        understand (it costs mana, say, or could be repeated), since
+        then there's no useful bound.
+        """
+        sources = self._get_mana_sources()
+        if sources is None:
+            return None
+        game = self.gamestate
+        once: List[Tuple[int, ...]] = []  # mana from abilities not tapping
+        taps: Dict[int, List[Tuple[int, ...]]] = {}  # {id(card): mana list}
+        helps: Dict[int, List[Tuple[int, ...]]] = {}  # also tap a creature
+        helpers: List[Cardboard] = []
+        fodder: Dict[int, Cardboard] = {}  # creatures helpers could tap
+        for caster, kind, mana, pattern in sources:
+            card = caster.source
+            if kind == "once":
+                once.append(mana)
+            elif kind == "tap":
+                taps.setdefault(id(card), []).append(mana)
+            else:
+                if id(card) not in helps:
+                    helpers.append(card)
+                helps.setdefault(id(card), []).append(mana)
+                for other in pattern.filter(self.field, game,
+                                            self.player_index, card):
+                    fodder[id(other)] = other
+
+        def most(value) -> int:
+            """Most of `value(mana)`, summed over every activation"""
+            tapped = {k: max([value(m) for m in opts])
+                      for k, opts in taps.items()}
+            helped = {k: max([value(m) for m in opts])
+                      for k, opts in helps.items()}
+            base = sum([value(m) for m in once]) + sum(tapped.values())
+            best = base
+            # try each distinct set of helpers, and have them tap whichever
+            # creatures would make the least mana by themselves
+            for num in range(1, len(helpers) + 1):
+                for chosen in Pilots.distinct_combinations(helpers, num):
+                    chosen_ids = [id(c) for c in chosen]
+                    gain = sum([helped[k] - tapped.get(k, 0)
+                                for k in chosen_ids])
+                    lost = sorted([tapped.get(k, 0) for k in fodder
+                                   if k not in chosen_ids])
+                    if len(lost) >= num:
+                        best = max(best, base + gain - sum(lost[:num]))
+            return best
+
+        gold = len(ManaPool.color_list) - 1
+        return ManaPotential(
+            most(sum),
+            tuple([most(lambda m: m[c] + m[gold]) for c in range(gold)]
+                  + [most(lambda m: m[gold])]))
+
+    def _get_mana_sources(self) -> List[tuple] | None:
+        """
+        For `get_mana_potential` and `get_auto_tap_plans`. One
+        (caster, kind, mana, pattern) for each mana ability which
+        could be activated right now. `kind` and `pattern` are from
+        `_get_mana_cost_kind`, and `mana` is what the ability adds,
+        as a tuple in ManaPool.color_list order. Equivalent cards
+        each get their own entry, one after another.
+        Returns None if some mana ability has a cost that
+        `_get_mana_cost_kind` doesn't understand.
+        """
+        game = self.gamestate
+        kinds = {}
+        for card in self.field:
+            for ability in card.get_activated():
+                if ability.is_type(Verbs.AddMana):
+                    kind = Player._get_mana_cost_kind(ability.cost)
+                    if (kind is None
+                            or type(ability.effect) is not Verbs.AddMana):
+                        return None
+                    kinds[id(ability)] = kind
+        groups = self.get_groups("field")
+        sources = []
+        for caster in self.get_valid_activations():
+            if not isinstance(caster, Verbs.PlayManaAbility):
+                continue
+            ability = caster.subject.obj
+            source = caster.source
+            kind, pattern = kinds[id(ability)]
+            [adder] = ability.effect.populate_options(game, self.player_index,
+                                                      source, None)
+            mana = ManaPool.parse(adder.inputs[0])
+            # equivalent cards can all do the same thing
+            index = [a is ability for a in source.get_activated()].index(True)
+            for card in groups[self._group_key(source)]:
+                if card is not source:
+                    caster = card.get_activated()[index].build_caster(
+                        game, self.player_index, card)
+                sources.append((caster, kind, mana, pattern))
+        return sources
+
+    def get_auto_tap_plans(self, card: Cardboard) -> List[Verbs.Verb]:
+        """
+        Ways to activate mana abilities and then cast the given
+        card from hand, each as a single Verb. Only minimal plans
+        are given: skipping any one of their activations would leave
+        too little mana. Activations of equivalent cards are
+        interchangeable, so each distinct number of activations of
+        each kind is only tried once. Abilities like Caretaker's
+        tap creatures which make the least mana by themselves.
+        If the card can already be cast, the plan is just its usual
+        caster. [] if the card can't be cast, or if some mana
+        ability isn't understood (see `_get_mana_sources`).
+        """
+        game = self.gamestate
+        caster = card.build_caster(game)
+        cost = card.cost.base_mana_cost
+        if not caster.can_be_done(game):
+            return []
+        if cost is None or self.pool.can_afford_mana_cost(cost):
+            return [caster] if card.valid_caster(game) is not None else []
+        sources = self._get_mana_sources()
+        if sources is None:
+            return []
+        # sort the activations into kinds which are interchangeable: the same
+        # ability on equivalent cards
+        kinds: Dict[tuple, list] = {}
+        for source in sources:
+            key = (self._group_key(source[0].source), source[0].subject.name)
+            kinds.setdefault(key, []).append(source)
+        kind_list = list(kinds.values())
+        group_sizes = Counter()  # cards which could tap, per group
+        for key, entries in kinds.items():
+            group_sizes[key[0]] = len(entries)
+        lost = {}  # {id(card): most mana that card makes by tapping}
+        for caster2, kind, mana, _ in sources:
+            if kind != "once":
+                lost[id(caster2.source)] = max(lost.get(id(caster2.source), 0),
+                                               sum(mana))
+        pool = ManaPool()
+
+        def can_pay(mana: List[int]) -> bool:
+            pool.data = tuple(mana)
+            return pool.can_afford_mana_cost(cost)
+
+        plans = []
+        for counts in product(*[range(len(e) + 1) for e in kind_list]):
+            # each card can only tap once
+            used = Counter()
+            chosen = {"once": [], "tap": [], "help": []}
+            for key, entries, num in zip(kinds, kind_list, counts):
+                first = used[key[0]] if entries[0][1] != "once" else 0
+                for entry in entries[first:first + num]:
+                    chosen[entry[1]].append(entry)
+                if entries[0][1] != "once":
+                    used[key[0]] += num
+            if any([used[g] > group_sizes[g] for g in used]):
+                continue
+            # must be able to pay, but not without any one of the activations
+            mana = list(self.pool.data)
+            for entries, num in zip(kind_list, counts):
+                mana = [m + num * add for m, add in zip(mana, entries[0][2])]
+            if not can_pay(mana):
+                continue
+            if any([can_pay([m - add for m, add in zip(mana, e[0][2])])
+                    for e, num in zip(kind_list, counts) if num > 0]):
+                continue
+            # helpers tap creatures which aren't already tapping for mana
+            tapping = [id(e[0].source) for e in chosen["tap"] + chosen["help"]]
+            fodder = {}
+            for entry in chosen["help"]:
+                for other in entry[3].filter(self.field, game,
+                                             self.player_index,
+                                             entry[0].source):
+                    if id(other) not in tapping:
+                        fodder[id(other)] = other
+            if len(fodder) < len(chosen["help"]):
+                continue
+            to_tap = sorted(fodder.values(), key=lambda c: lost.get(id(c), 0)
+                            )[:len(chosen["help"])]
+            mana_casters = [e[0] for e in (chosen["once"] + chosen["tap"]
+                                           + chosen["help"])]
+            plans.append(Verbs.AutoTapCast(mana_casters, caster, to_tap))
+        return plans
+
+    def get_auto_tap_castables(self) -> List[Verbs.Verb] | None:
+        """Like `get_valid_castables`, but for pilots which
+        `auto_tap`: cards which cost mana come bundled with the
+        mana abilities to pay for them (see `get_auto_tap_plans`).
+        Returns None if some mana ability isn't understood (see
+        `_get_mana_sources`). Then the usual castables and mana
+        abilities have to be used instead."""
+        if self._get_mana_sources() is None:
+            return None
+        castables = [c for c in self.get_valid_castables()
+                     if c.subject.obj.cost.base_mana_cost is None]
+        for group in self.get_groups("hand").values():
+            card = group[0]
+            if card.cost.base_mana_cost is not None:
+                castables += self.get_auto_tap_plans(card)
+        return castables
+
+    @staticmethod
+    def _get_mana_cost_kind(cost: Costs.Cost
+                            ) -> Tuple[str, Match2.Pattern | None] | None:
+        """For `get_mana_potential`. Returns ("tap", None) if the
+        cost taps the source, ("once", None) if it can only be paid
+        once per turn, ("help", pattern) if it taps the source and
+        another creature matching the pattern. None otherwise."""
+        if cost.base_mana_cost is not None:
+            return None
+        taps_self = False
+        once = False
+        other = None
+        for verb in cost.additional:
+            if isinstance(verb, Verbs.TapSymbol):
+                taps_self = True
+            elif isinstance(verb, Verbs.ActivateOncePerTurn):
+                once = True
+            elif isinstance(verb, Verbs.AddCounter):
+                continue
+            elif (isinstance(verb, Verbs.ApplyToTargets)
+                  and type(verb.sub_verbs[0]) is Verbs.Tap
+                  and isinstance(verb.inputs[0], Get.Any)):
+                other = verb.inputs[0].pattern
+            else:
+                return None
+        if taps_self:
+            return ("tap", None) if other is None else ("help", other)
+        elif once and other is None:
+            return "once", None
+        return None
+
+    def could_use_more_mana(self) -> bool:
+        """
+        Whether making more mana might let this player cast a card
+        from their hand, or activate an ability which costs mana,
+        that they can't already. False only if that's impossible
+        even with as much mana as `get_mana_potential` allows.
+        """
+        potential = self.get_mana_potential()
+        if potential is None:
+            return True
+        castable = [self._group_key(caster.subject.obj)
+                    for caster in self.get_valid_castables()]
+        for card in self.hand:
+            cost = card.cost
+            if (cost is not None and cost.base_mana_cost is not None
+                    and self._group_key(card) not in castable
+                    and potential.could_pay(self.pool, cost.base_mana_cost)):
+                return True
+        for card in self.hand + self.field + self.grave:
+            for ability in card.get_activated():
+                cost = ability.cost.base_mana_cost
+                if (not ability.is_type(Verbs.AddMana) and cost is not None
+                        and potential.could_pay(self.pool, cost)):
+                    return True
+        return False
+
+    def has_mana_costed_abilities(self) -> bool:
+        """Whether any card in hand, field, or grave has an
+        activated ability, other than a mana ability, which costs
+        mana. For `auto_tap`, which otherwise only makes mana while
+        casting a card, so that mana couldn't pay for those."""
+        for card in self.hand + self.field + self.grave:
+            for ability in card.get_activated():
+                if (not ability.is_type(Verbs.AddMana)
+                        and ability.cost.base_mana_cost is not None):
+                    return True
+        return False
+
+    def _get_cached_positions(self) -> Tuple[list, list] | None:
+        key = (hash(self.gamestate), self.player_index)
+        return self.gamestate.action_cache.get(key, self.gamestate.get_id())
+
+    def _cache_positions(self) -> Tuple[List[Verbs.UniversalCaster],
+                                        List[Verbs.UniversalCaster]]:
+        """Finds the valid activations and castables the slow
+        way, stores their positions in the action_cache, and
+        returns them."""
+        activations = self._find_valid_activations(True)
+        castables = self._find_valid_castables(True)
+        key = (hash(self.gamestate), self.player_index)
+        self.gamestate.action_cache.put(key, ([pos for pos, _ in activations],
+                                              [pos for pos, _ in castables]),
+                                        self.gamestate.get_id())
+        return ([caster for _, caster in activations],
+                [caster for _, caster in castables])
+
+    def get_groups(self, zone_name: str) -> Dict[str, List[Cardboard]]:
+        """
+        Sorts the cards of the "hand", "field", or "grave" into
+        groups of equivalent cards, keyed by their ID.
+        The groups are in order of their first card, so walking
+        the dict gives one representative per equivalence class.
+        Cached until the GameState's `generation` changes, which
+        every card entering, leaving, or changing does. So DON'T
+        MUTATE the returned dict or lists.
+        """
+        cards: List[Cardboard] = getattr(self, zone_name)
+        token = (self.gamestate.generation, len(cards))
+        cached = self._groups.get(zone_name)
+        if cached is not None and cached[0] is cards and cached[1] == token:
+            return cached[2]
+        groups: Dict[str, List[Cardboard]] = {}
+        tracked = True
+        for card in cards:
+            groups.setdefault(Player._group_key(card), []).append(card)
+            tracked = tracked and card.hashed_value is not None
+        # cards which aren't in card_hash (e.g. in tests) can change without
+        # bumping the generation, so don't cache their groups
+        self._groups[zone_name] = (cards, token if tracked else None, groups)
+        return groups
+
+    @staticmethod
+    def _group_key(card: Cardboard) -> str:
+        return card.get_id()
+
+    def _find_valid_activations(self, hide_equivalent: bool
+                                ) -> List[Tuple[tuple, Verbs.PlayAbility]]:
+        """Returns (position, caster) for each valid activation.
+        See `ActionCache` for the format of the positions."""
+        activatables: List[Tuple[tuple, Verbs.PlayAbility]] = []
+        game = self.gamestate
+        # temporarily set decision_maker to be "try_all", to see if ANY method
+        # of casting this card will work.
+        old_pilot = self.pilot
+        self.pilot = Pilots.BotTriesAll()
+        for zone in ("hand", "field", "grave"):
+            groups = self.get_groups(zone)
+            for ii, source in enumerate(getattr(self, zone)):
+                if (hide_equivalent
+                        and groups[self._group_key(source)][0] is not source):
+                    continue  # only check the first card of each group
+                for jj, ability in enumerate(source.get_activated()):
+                    key = self._caster_key(source, jj, ability.cost,
+                                           not ability.is_type(Verbs.AddMana))
+                    valid = None if key is None else game.caster_cache.get(key)
+                    if valid is None:
+                        caster = ability.valid_caster(game, self.player_index,
+                                                      source)
+                        if key is not None:
+                            game.caster_cache.put(key, caster is not None)
+                    elif valid:
+                        caster = ability.build_caster(game, self.player_index,
+                                                      source)
+                    else:
+                        caster = None
+                    if caster is not None:
+                        activatables.append(((zone, ii, jj), caster))
+        self.pilot = old_pilot  # reset pilot
+        return activatables
+
+    def _find_valid_castables(self, hide_equivalent: bool
+                              ) -> List[Tuple[int, Verbs.PlayCardboard]]:
+        """Returns (index in hand, caster) for each valid
+        castable card."""
+        castables: List[Tuple[int, Verbs.PlayCardboard]] = []
+        groups = self.get_groups("hand")
         game = self.gamestate
         # temporarily set pilot to be "try_all", to see if ANY method
         # of casting this card will work.
         old_pilot = self.pilot
         self.pilot = Pilots.BotTriesAll()
-        for card in self.hand:
-            # skip cards equivalent to those
-            # already searched
-            if (any([card.is_equiv_to(ob) for ob in active_objects])
-                    and hide_equivalent):
+        for ii, card in enumerate(self.hand):
+            # skip cards equivalent to one already checked
+            if (hide_equivalent
+                    and groups[self._group_key(card)][0] is not card):
                 continue
             # check if this card can be cast.
-            caster = card.valid_caster(game)
+            key = self._caster_key(card, -1, card.cost,
+                                   card.effect is not None)
+            valid = None if key is None else game.caster_cache.get(key)
+            if valid is None:
+                caster = card.valid_caster(game)
+                if key is not None:
+                    game.caster_cache.put(key, caster is not None)
+            elif valid:
+                caster = card.build_caster(game)
+            else:
+                caster = None
             if caster is not None:
-                active_objects.append(card)
-                castables.append(caster)
+                castables.append((ii, caster))
         self.pilot = old_pilot  # reset pilot
         return castables
 
+    def _caster_key(self, card: Cardboard, ability_index: int,
+                    cost: Costs.Cost, has_effect: bool) -> tuple | None:
+        """
+        Everything that decides whether the card can be cast
+        (ability_index -1) or its ability activated. Only changes
+        when one of those things changes, so any other card can
+        come and go without making this card be checked again.
+        That's the card itself (its RulesText class, not just the
+        name, plus tapped, counters, etc) and the timing, plus the
+        player's mana, life, land drops, etc if the cost uses them.
+        Plus all the other cards, if the cost looks at them or if
+        static effects might change things.
+        Returns None if there's an effect which needs choices,
+        since then it depends on the entire GameState. Those are
+        only remembered by the `action_cache`.
+        """
+        if has_effect:
+            return None
+        game = self.gamestate
+        key = (type(card.rules_text), card.get_id(), ability_index,
+               self.player_index, game.active_player_index,
+               game.priority_player_index, game.phase, len(game.stack))
+        if any([isinstance(v, Verbs.AffectPlayer) for v in cost.additional]):
+            key += (self.pool.data, self.life, self.num_lands_played,
+                    self.num_spells_cast)
+        elif cost.base_mana_cost is not None:
+            key += (self.pool.data,)
+        if (not cost.is_self_contained or len(game.statics) > 0
+                or len(game.statics_to_remove) > 0):
+            key += (game.card_hash,)
+        return key
+
     # -----------
 
     def add_to_hand(self, card: Cardboard):
@@ -894,6 +1874,8 @@ class Player:
         card.zone = Zone.Hand(self.player_index)
         self.hand.append(card)
         self.re_sort_hand()
+        self.gamestate.hash_card(card)
+        self.aggregates["hand"].update(Player.get_aggregate_keys(card))
 
     def remove_from_hand(self, card: Cardboard):
         """
@@ -903,6 +1885,8 @@ class Player:
         index = card.zone.location
         self.hand.pop(index)
         card.zone = Zone.Unknown()
+        self.gamestate.unhash_card(card)
+        self.aggregates["hand"].subtract(Player.get_aggregate_keys(card))
         # order didn't change, so no need to re-sort. just fix indexing.
         for ii in range(index, len(self.hand)):
             self.hand[ii].zone.location = ii
@@ -918,6 +1902,8 @@ class Player:
         card.zone = Zone.Field(self.player_index)
         self.field.append(card)
         self.re_sort_field()
+        self.gamestate.hash_card(card)
+        self.aggregates["field"].update(Player.get_aggregate_keys(card))
         # add mechanism to sense triggers from cards in play
         # noinspection PyTypeChecker
         for ability in (card.rules_text.trig_verb + card.rules_text.trig_timed
@@ -933,6 +1919,8 @@ class Player:
         index = card.zone.location
         self.field.pop(index)
         card.zone = Zone.Unknown()
+        self.gamestate.unhash_card(card)
+        self.aggregates["field"].subtract(Player.get_aggregate_keys(card))
         # order didn't change, so no need to re-sort. just fix indexing.
         for ii in range(index, len(self.field)):
             self.field[ii].zone.location = ii
@@ -960,6 +1948,8 @@ class Player:
         card.zone = Zone.Grave(self.player_index)
         self.grave.append(card)
         self.re_sort_grave()
+        self.gamestate.hash_card(card)
+        self.aggregates["grave"].update(Player.get_aggregate_keys(card))
 
     def remove_from_grave(self, card: Cardboard):
         """
@@ -969,6 +1959,8 @@ class Player:
         index = card.zone.location
         self.grave.pop(index)
         card.zone = Zone.Unknown()
+        self.gamestate.unhash_card(card)
+        self.aggregates["grave"].subtract(Player.get_aggregate_keys(card))
         # order didn't change, so no need to re-sort. just fix indexing.
         for ii in range(index, len(self.grave)):
             self.grave[ii].zone.location = ii
@@ -992,6 +1984,7 @@ class Player:
             dist_from_bottom += len(self.deck) + 1
         card.zone = Zone.Deck(self.player_index, dist_from_bottom)
         self.deck.insert(dist_from_bottom, card)
+        self.gamestate.generation += 1
         # order didn't change, but need to fix indexing.
         for ii in range(dist_from_bottom, len(self.deck)):
             self.deck[ii].zone.location = ii
@@ -1005,6 +1998,7 @@ class Player:
         index = card.zone.location
         self.deck.pop(index)
         card.zone = Zone.Unknown()
+        self.gamestate.generation += 1
         # order didn't change, but need to fix indexing.
         for ii in range(index, len(self.deck)):
             self.deck[ii].zone.location = ii
@@ -33,6 +33,10 @@ class GetterQuery:
 
 
 class Getter:
+    # whether results can be memoized in the GameState's getter cache.
+    # only for Getters which return values, not lists of game objects.
+    cacheable: bool = False
+
     def get(self, state: GameState, player: int, source: Cardboard):
         """
         Return the value of the parameter or concept we are
@@ -45,10 +49,37 @@ class Getter:
         index of that card's controlling Player.
         The returned value takes into account any static
         effects which may change the result.
+        Results of cacheable Getters are memoized in the GameState
+        until it next changes. See `GameState.get_getter_cache`.
         """
+        if not self.cacheable or state.num_ignored_effects > 0:
+            return self._get_modified(state, player, source)
+        cache = state.get_getter_cache()
+        # Getters without parameters are all interchangeable. Checks for an
+        # __init__ rather than looking in __dict__, which may not exist.
+        key = (type(self) if type(self).__init__ is object.__init__ else self,
+               player, id(source))
+        hit = cache.get(key)
+        if hit is not None and hit[0] is source:  # id can be reused
+            return self._copy_result(hit[1])
+        value = self._get_modified(state, player, source)
+        cache[key] = (source, value)
+        return self._copy_result(value)
+
+    def _copy_result(self, value):
+        """Cached results are handed out to every caller, so
+        Getters with mutable results return copies of them."""
+        return value
+
+    def _get_modified(self, state: GameState, player: int, source: Cardboard):
+        """The value from `_get`, after applying any static effects
+        which modify it."""
         iterate_value = self._get(state, player, source)
+        holders = state.get_static_holders(self)
+        if len(holders) == 0:
+            return iterate_value  # nothing can modify it, so skip the query
         query = GetterQuery(self, state, player, source)
-        for holder in state.statics + state.statics_to_remove:
+        for _, holder in holders:
             # NOTE: `is_applicable` calls `GetterPattern.match`,
             # which may call `Getters.get` (this function).
             # For the purpose of deciding if an effect applies,
@@ -70,6 +101,7 @@ class Getter:
 
 class GetInteger(Getter):
     """Return type of the Getter is an integer or None"""
+    cacheable = True
 
     def _get(self, state: GameState, player: int, source: Cardboard):
         raise NotImplementedError
@@ -77,6 +109,7 @@ class GetInteger(Getter):
 
 class GetIntPair(Getter):
     """Return type of the Getter is a pair (tuple) of integers or Nones"""
+    cacheable = True
 
     def _get(self, state: GameState, player: int, source: Cardboard):
         raise NotImplementedError
@@ -84,6 +117,7 @@ class GetIntPair(Getter):
 
 class GetBool(Getter):
     """Return type of the Getter is a bool"""
+    cacheable = True
 
     def _get(self, state: GameState, player: int, source: Cardboard):
         raise NotImplementedError
@@ -91,6 +125,7 @@ class GetBool(Getter):
 
 class GetString(Getter):
     """Return type of the Getter is a single string"""
+    cacheable = True
 
     def _get(self, state: GameState, player: int, source: Cardboard):
         raise NotImplementedError
@@ -98,13 +133,18 @@ class GetString(Getter):
 
 class GetStringList(Getter):
     """Return type of the Getter is a list of strings"""
+    cacheable = True
 
     def _get(self, state: GameState, player: int, source: Cardboard):
         raise NotImplementedError
 
+    def _copy_result(self, value):
+        return value[:]
+
 
 class Const(Getter):
     """Returns a constant value, defined at initialization"""
+    cacheable = False  # nothing to save
 
     def __init__(self, value):
         self.value = value
@@ -233,9 +273,30 @@ class Count(GetInteger):
 
     def _get(self, state: GameState, player: int, source: Cardboard) -> int:
         to_check = self.zone.get_absolute_zones(state, player, source)
-        return sum([len([c for c in zone.get(state)
-                         if self.pattern.match(c, state, player, source)])
-                    for zone in to_check])
+        # simple patterns can use the counts the Players keep, so long as
+        # no static effect changes the characteristic being counted
+        key = self.pattern.get_aggregate_key()
+        if key is not None and (key[0] is None or len(
+                state.get_static_holders(key[0]())) == 0):
+            counts = [zone.get_aggregate(state, key) for zone in to_check]
+            if None not in counts:
+                return sum(counts)
+        match = self.pattern.compile()
+        plain = Match2.get_plain_getters(state)
+        total = 0
+        for zone in to_check:
+            for group in zone.get_groups(state):
+                # equivalent cards all match or all don't, except that
+                # the source itself might be special (see Match2.Another)
+                if len(group) > 1 and any([c is source for c in group]):
+                    if match(source, state, player, source, plain):
+                        total += 1
+                    rep = group[0] if group[0] is not source else group[1]
+                    if match(rep, state, player, source, plain):
+                        total += len(group) - 1
+                elif match(group[0], state, player, source, plain):
+                    total += len(group)
+        return total
 
     def __str__(self):
         return super().__str__() + "(" + str(self.pattern) + ")"
@@ -407,8 +468,7 @@ class AllWhich:
         """
         if not isinstance(options, list):
             options = options.get(state, player, card)
-        sub_list = [obj for obj in options
-                    if self.pattern.match(obj, state, player, card)]
+        sub_list = self.pattern.filter(options, state, player, card)
         return [tuple(sub_list)]  # turn sub-list into tuple, wrap into list
 
     def __str__(self):
@@ -448,7 +508,6 @@ class Chooser(AllWhich):
                 return [(c,) for c in decider.choose_exactly_one(options)]
             else:
                 return decider.choose_exactly_n(options, num)
-        # TODO: add equivalence screening?
 
     def __str__(self):
         less_ok = "<=" if self.can_be_less else ""
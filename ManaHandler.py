@@ -4,113 +4,265 @@ Created on Tue Dec 29 12:41:07 2020
 
 @author: Cobi
 """
+from __future__ import annotations
+from typing import Dict, List, Tuple
+
+
+# mana strings which have already been parsed, so that each string only
+# ever gets counted once. {string: tuple of counts}
+_pool_strings: Dict[str, Tuple[int, ...]] = {}
+_cost_strings: Dict[str, Tuple[int, ...]] = {}
+
+_COLORED = range(6)  # indices of W,U,B,R,G,C in both pools and costs
+_GOLD = 6  # index of gold in both pools and costs
+_GENERIC = 7  # index of generic in a cost
+
+
+def _minus(counts: Tuple[int, ...], index: int, amount: int
+           ) -> Tuple[int, ...]:
+    """Copy of the tuple of counts, with amount removed from index"""
+    return counts[:index] + (counts[index] - amount,) + counts[index + 1:]
+
+
+def _covers(pool: Tuple[int, ...], other: Tuple[int, ...]) -> bool:
+    """Can the first pool pay for anything the other pool could? True
+    if it has at least as much gold, and its extra gold covers any
+    colors it is short on."""
+    gold = pool[_GOLD] - other[_GOLD]
+    if gold < 0:
+        return False
+    for c in _COLORED:
+        if pool[c] < other[c]:
+            gold -= other[c] - pool[c]
+    return gold >= 0
 
 
 class ManaPool:
     color_list = ["W", "U", "B", "R", "G", "C", "A"]
 
-    def __init__(self, cost_str: str):
+    def __init__(self, cost_str: str = ""):
         """Takes in a string in the usual mtg color syntax. This
         is a mana POOL, so there's no such thing as generic mana
         here. Everything must be specified. 'C' is colorless,
         'A' is gold (can be used for any color)."""
-        cost_str = cost_str.upper()
-        self.data = {}  # dictionary of {color:amount}
-        for s in ManaPool.color_list:
-            self.data[s] = cost_str.count(s)
+        # tuple of amounts, in the same order as color_list
+        self.data: Tuple[int, ...] = ManaPool.parse(cost_str)
+
+    @staticmethod
+    def parse(cost_str: str) -> Tuple[int, ...]:
+        """The amount of each color in the string, in the same
+        order as color_list. Each string is only counted once."""
+        try:
+            return _pool_strings[cost_str]
+        except KeyError:
+            upper = cost_str.upper()
+            counts = tuple([upper.count(s) for s in ManaPool.color_list])
+            _pool_strings[cost_str] = counts
+            return counts
 
     def cmc(self):
         """ "converted mana cost". An int, ignoring color"""
-        return sum(self.data.values())
+        return sum(self.data)
 
-    def add_mana(self, mana):
-        if isinstance(mana, str):
-            mana = ManaPool(mana)
-        for s in ManaPool.color_list:
-            self.data[s] += mana.data[s]
+    def add_mana(self, mana: ManaPool | str):
+        """MUTATES."""
+        add = mana.data if isinstance(mana, ManaPool) else ManaPool.parse(mana)
+        w, u, b, r, g, c, a = self.data
+        self.data = (w + add[0], u + add[1], b + add[2], r + add[3],
+                     g + add[4], c + add[5], a + add[6])
 
-    def can_afford_mana_cost(self, cost):
-        if self.cmc() < cost.cmc():
+    def can_afford_mana_cost(self, cost: ManaCost | str):
+        need = (cost.data if isinstance(cost, ManaCost)
+                else ManaCost.parse(cost))
+        have = self.data
+        if sum(have) < sum(need):
             return False
-        gold = self.data["A"]
-        for c in ["W", "U", "B", "R", "G", "C"]:
-            if self.data[c] < cost.data[c]:
+        gold = have[_GOLD] - need[_GOLD]
+        if gold < 0:
+            return False
+        for c in _COLORED:
+            if have[c] < need[c]:
                 # pool doesn't haven enough mana of this color! dip into gold
-                gold -= (cost.data[c] - self.data[c])
+                gold -= (need[c] - have[c])
                 if gold < 0:  # don't have enough gold either!
                     return False
                     # if reached here, we have enough colored mana
         return True
 
-    def pay_mana_cost(self, cost):
+    def pay_mana_cost(self, cost: ManaCost | str):
+        """MUTATES."""
         assert (self.can_afford_mana_cost(cost))
+        need = (cost.data if isinstance(cost, ManaCost)
+                else ManaCost.parse(cost))
+        pool = list(self.data)
+        pool[_GOLD] -= need[_GOLD]
         # pay the colored costs first
-        for c in ManaCost.color_list:  # yes, Cost not Pool
-            if self.data[c] >= cost.data[c]:  # can pay without gold
-                self.data[c] -= cost.data[c]
-            else:
-                self.data[c] = 0
-                self.data["A"] -= (cost.data[c] - self.data[c])
-        # still need to pay generic part of the cost
-        k = 0
-        paid = 0
-        while paid < cost.data["gen"] and k <= 5:
-            color = ManaPool.color_list[k]
-            if self.data[color] > 1:  # try to save at least 1 of each color
-                self.data[color] -= 1
-                paid += 1
+        for c in _COLORED:
+            if pool[c] >= need[c]:  # can pay without gold
+                pool[c] -= need[c]
             else:
-                k += 1
+                pool[_GOLD] -= (need[c] - pool[c])
+                pool[c] = 0
+        # still need to pay generic part of the cost. try to save at least
+        # 1 of each color
+        generic = need[_GENERIC]
+        for c in _COLORED:
+            if generic > 0 and pool[c] > 1:
+                spent = min(pool[c] - 1, generic)
+                pool[c] -= spent
+                generic -= spent
         # if reached here, I DO need to start emptying out some colors entirely
-        k = 0
-        while paid < cost.data["gen"]:
-            color = ManaPool.color_list[k]
-            if self.data[color] > 0:
-                self.data[color] -= 1
-                paid += 1
-            else:
-                k += 1
+        for c in range(len(pool)):
+            if generic > 0:
+                spent = min(pool[c], generic)
+                pool[c] -= spent
+                generic -= spent
+        self.data = tuple(pool)
+
+    def get_payments(self, cost: ManaCost | str) -> List[str]:
+        """
+        Every distinct way to pay the cost from this pool, as
+        strings saying exactly which mana to spend. Each payment
+        leaves behind a different pool. If another payment would
+        leave behind a pool that can pay for everything this one
+        can (more gold instead of colors, say), it is dropped.
+        Returns [] if the cost can't be paid at all.
+        """
+        need = (cost.data if isinstance(cost, ManaCost)
+                else ManaCost.parse(cost))
+        if not self.can_afford_mana_cost(cost):
+            return []
+        # the set of pools which could be left over after paying each part
+        # of the cost in turn. equivalent paths merge as they go.
+        pools = {_minus(self.data, _GOLD, need[_GOLD])}
+        for c in _COLORED:
+            if need[c] == 0:
+                continue
+            paid = set()
+            for p in pools:
+                # use real mana of this color, gold to make up the difference
+                for real in range(max(0, need[c] - p[_GOLD]),
+                                  min(p[c], need[c]) + 1):
+                    paid.add(_minus(_minus(p, c, real),
+                                    _GOLD, need[c] - real))
+            pools = paid
+        # generic can come from anywhere. go one color at a time, tracking
+        # how much is still owed
+        owed = {(p, need[_GENERIC]) for p in pools}
+        for c in range(len(self.data)):
+            paid = set()
+            for p, left in owed:
+                for spent in range(min(p[c], left) + 1):
+                    paid.add((_minus(p, c, spent), left - spent))
+            owed = paid
+        leftovers = [p for p, left in owed if left == 0]
+        best = [p for p in leftovers
+                if not any([q != p and _covers(q, p) for q in leftovers])]
+        return ["".join([s * (n - m) for s, n, m
+                         in zip(ManaPool.color_list, self.data, p)])
+                for p in sorted(best, reverse=True)]
 
     def __str__(self):
-        mana_string = ""
-        for s in ManaPool.color_list:
-            mana_string += s * self.data[s]
-        return mana_string
+        return "".join([s * n for s, n in zip(ManaPool.color_list,
+                                              self.data)])
 
     def copy(self):
-        return ManaPool(str(self))
+        # the tuple never mutates, so the copy can share it
+        new_pool = ManaPool.__new__(ManaPool)
+        new_pool.data = self.data
+        return new_pool
 
     def __eq__(self, other):
         # two pools are equal if they have the same in each entry
-        for color, amount in self.data.items():
-            if amount != other.data[color]:
-                return False
-        return True
+        return self.data == other.data
+
+    def __hash__(self):
+        return hash(self.data)
 
 
 # -----------------------------------------------------------------------------
 
 class ManaCost:
-    color_list = ["W", "U", "B", "R", "G", "C"]
+    color_list = ["W", "U", "B", "R", "G", "C", "A"]
 
     def __init__(self, cost_str: str):
         """Takes in a string in the usual mtg color syntax. Numbers represent
-        "generic" mana, which can be paid later with any color of mana"""
-        cost_str = cost_str.upper()
-        self.data = {}
-        for s in ManaCost.color_list:
-            self.data[s] = cost_str.count(s)
-        num_str = ''.join(i for i in cost_str if i.isdigit())
-        self.data["gen"] = int(num_str) if num_str else 0
+        "generic" mana, which can be paid later with any color of mana.
+        No printed cost has 'A', but here it means mana which must be
+        paid with gold. That way, any ManaPool string is also a cost
+        which spends exactly that mana."""
+        # tuple of amounts in the same order as color_list, then generic
+        self.data: Tuple[int, ...] = ManaCost.parse(cost_str)
+
+    @staticmethod
+    def parse(cost_str: str) -> Tuple[int, ...]:
+        """The amount of each color in the string, in the same
+        order as color_list, and then the generic amount. Each
+        string is only counted once."""
+        try:
+            return _cost_strings[cost_str]
+        except KeyError:
+            upper = cost_str.upper()
+            num_str = ''.join(i for i in upper if i.isdigit())
+            counts = tuple([upper.count(s) for s in ManaCost.color_list]
+                           + [int(num_str) if num_str else 0])
+            _cost_strings[cost_str] = counts
+            return counts
 
     def cmc(self):
-        return sum(self.data.values())
+        return sum(self.data)
 
     def __str__(self):
-        mana_string = str(self.data["gen"]) if self.data["gen"] > 0 else ""
-        for s in ManaCost.color_list:
-            mana_string += s * self.data[s]
+        generic = self.data[_GENERIC]
+        mana_string = str(generic) if generic > 0 else ""
+        for s, n in zip(ManaCost.color_list, self.data):
+            mana_string += s * n
         return mana_string
 
     def copy(self):
-        return ManaCost(str(self))
+        new_cost = ManaCost.__new__(ManaCost)
+        new_cost.data = self.data
+        return new_cost
+
+    def __eq__(self, other):
+        return self.data == other.data
+
+    def __hash__(self):
+        return hash(self.data)
+
+
+# -----------------------------------------------------------------------------
+
+class ManaPotential:
+    """The most mana a player could still make, from mana abilities
+    already on the battlefield (see Player.get_mana_potential)."""
+
+    def __init__(self, total: int, most: Tuple[int, ...]):
+        """`total` is the most mana that could be made at once.
+        `most` is, for each color in ManaPool.color_list, the most
+        mana that could be spent as that color. Gold counts for
+        every color. These maxima might not all be possible at the
+        same time, so this is an upper bound."""
+        self.total: int = total
+        self.most: Tuple[int, ...] = most
+
+    def could_pay(self, pool: ManaPool, cost: ManaCost | str) -> bool:
+        """False if there is definitely no way to pay the cost, even
+        after adding as much mana as possible to the pool. True if
+        it might be possible."""
+        need = (cost.data if isinstance(cost, ManaCost)
+                else ManaCost.parse(cost))
+        have = pool.data
+        if sum(have) + self.total < sum(need):
+            return False
+        if have[_GOLD] + self.most[_GOLD] < need[_GOLD]:
+            return False
+        for c in _COLORED:
+            if have[c] + have[_GOLD] + self.most[c] < need[c]:
+                return False
+        return True
+
+    def __str__(self):
+        return "Potential(%i: %s)" % (
+            self.total, ",".join(["%s%i" % (s, n) for s, n
+                                  in zip(ManaPool.color_list, self.most)]))
@@ -6,7 +6,7 @@ Created on Sun Jun 26 18:08:14 2022
 """
 
 from __future__ import annotations
-from typing import List, Type
+from typing import Callable, List, Tuple, Type
 
 import Getters as Get
 import Verbs
@@ -15,6 +15,22 @@ from GameState import GameState, Player
 import Zone
 
 
+# cost of a compiled check, so that `Pattern.compile` can do cheap ones first
+_CHEAP = 0  # identity, attribute, and isinstance checks
+_PRINTED = 1  # printed traits, which static effects might modify
+_GETTER = 2  # anything else, usually through Getters
+
+
+def get_plain_getters(state: GameState) -> frozenset:
+    """The Getter types for printed traits (keywords, card types,
+    name, tapped-ness) which no static effect in the GameState
+    could possibly modify. Compiled Patterns can read those traits
+    straight off the Cardboard instead of going through Getters."""
+    return frozenset([g for g in (Get.Keywords, Get.CardTypes,
+                                  Get.CardName, Get.IsTapped)
+                      if len(state.get_static_holders(g())) == 0])
+
+
 # #------------------------------------------------------------------------------
 # #------------------------------------------------------------------------------
 
@@ -59,6 +75,54 @@ class Pattern:
         """
         raise NotImplementedError
 
+    def get_aggregate_key(self) -> tuple | None:
+        """If a card matching this Pattern depends only on one
+        printed characteristic of the card, returns the key that
+        `Player.aggregates` counts such cards under. Otherwise
+        None, meaning each card has to be checked."""
+        return None
+
+    _compiled: Callable | None = None  # filled in by `compile`
+
+    def compile(self) -> Callable:
+        """
+        Returns a predicate which gives the same answer as `match`,
+            but faster. It takes (subject, state, asking_player,
+            asking_card, plain), where `plain` is the set of Getter
+            types which no static effect modifies in this GameState
+            (see `filter`), or None if not known.
+        Nested "and"s and "or"s are flattened, and cheap checks are
+            done before checks that use Getters. Cached, since the
+            Pattern never changes once made.
+        """
+        if self._compiled is None:
+            self._compiled = self._compile()[1]
+        return self._compiled
+
+    def __getstate__(self):
+        # compiled predicates are closures, which can't be pickled.
+        # they get rebuilt on the next call to `compile` anyway.
+        state = self.__dict__.copy()
+        state.pop("_compiled", None)
+        return state
+
+    def _compile(self) -> Tuple[int, Callable]:
+        """Returns (cost, predicate). By default, the predicate
+        just calls `match`. Subclasses can do better."""
+        match = self.match
+        return _GETTER, lambda sub, state, pl, card, plain: match(sub, state,
+                                                                  pl, card)
+
+    def filter(self, subjects: list, state: GameState, asking_player: int,
+               asking_card: Cardboard) -> list:
+        """Returns the subjects which match this Pattern, in the
+        same order. Same as calling `match` on each, but checks
+        for relevant static effects only once for all of them."""
+        pred = self.compile()
+        plain = get_plain_getters(state)
+        return [sub for sub in subjects
+                if pred(sub, state, asking_player, asking_card, plain)]
+
     def __str__(self):
         return type(self).__name__
 
@@ -72,6 +136,14 @@ class Pattern:
         return _Negated(self)
 
 
+def _flatten(pattern: _AnyOf | _AllOf, kind: type) -> List[Pattern]:
+    """The patterns inside nested _AnyOfs (or _AllOfs), as one list"""
+    flat = []
+    for p in pattern.patterns:
+        flat += _flatten(p, kind) if type(p) is kind else [p]
+    return flat
+
+
 class _AnyOf(Pattern):
     """A pattern which returns true if the card matches ANY
         (rather than all) of the given pattern."""
@@ -83,6 +155,18 @@ class _AnyOf(Pattern):
         return any([p.match(subject, state, asking_player, asking_card)
                     for p in self.patterns])
 
+    def _compile(self) -> Tuple[int, Callable]:
+        parts = sorted([p._compile() for p in _flatten(self, _AnyOf)],
+                       key=lambda part: part[0])
+        preds = [pred for _, pred in parts]
+
+        def any_of(sub, state, pl, card, plain):
+            for pred in preds:
+                if pred(sub, state, pl, card, plain):
+                    return True
+            return False
+        return max([cost for cost, _ in parts]), any_of
+
     def __str__(self):
         return " or ".join([str(p) for p in self.patterns])
 
@@ -98,6 +182,18 @@ class _AllOf(Pattern):
         return all([p.match(subject, state, asking_player, asking_card)
                     for p in self.patterns])
 
+    def _compile(self) -> Tuple[int, Callable]:
+        parts = sorted([p._compile() for p in _flatten(self, _AllOf)],
+                       key=lambda part: part[0])
+        preds = [pred for _, pred in parts]
+
+        def all_of(sub, state, pl, card, plain):
+            for pred in preds:
+                if not pred(sub, state, pl, card, plain):
+                    return False
+            return True
+        return max([cost for cost, _ in parts]), all_of
+
     def __str__(self):
         return " and ".join([str(p) for p in self.patterns])
 
@@ -110,6 +206,11 @@ class _Negated(Pattern):
         return not self.pattern.match(subject, state, asking_player,
                                       asking_card)
 
+    def _compile(self) -> Tuple[int, Callable]:
+        cost, inner = self.pattern._compile()
+        return cost, lambda sub, state, pl, card, plain: not inner(
+            sub, state, pl, card, plain)
+
     def __str__(self):
         return "not " + str(self.pattern)
 
@@ -118,6 +219,12 @@ class Anything(Pattern):
     def _match(self, subject, state, asking_player, asking_card) -> bool:
         return True
 
+    def get_aggregate_key(self) -> tuple | None:
+        return None, None
+
+    def _compile(self) -> Tuple[int, Callable]:
+        return _CHEAP, lambda sub, state, pl, card, plain: True
+
     def __str__(self):
         return ""
 
@@ -126,6 +233,9 @@ class Nothing(Pattern):
     def _match(self, subject, state, asking_player, asking_card) -> bool:
         return False
 
+    def _compile(self) -> Tuple[int, Callable]:
+        return _CHEAP, lambda sub, state, pl, card, plain: False
+
     def __str__(self):
         return ""
 
@@ -147,6 +257,30 @@ class CardPattern(Pattern):
                asking_card: Cardboard) -> bool:
         raise NotImplementedError
 
+    # subclasses which only look at the Cardboard itself can lower this
+    _cost: int = _GETTER
+
+    def _compile(self) -> Tuple[int, Callable]:
+        match = self.match
+        return self._cost, lambda sub, state, pl, card, plain: match(
+            sub, state, pl, card)
+
+    def _compile_printed(self, getter_type: type, read: Callable
+                         ) -> Tuple[int, Callable]:
+        """For Patterns which check a single printed trait. If no
+        static effect can change that trait (`getter_type` is in
+        `plain`), `read` the trait straight off the Cardboard
+        instead of going through the Getter."""
+        match = self._match
+
+        def printed(sub, state, pl, card, plain):
+            if not isinstance(sub, Cardboard):
+                return False
+            if plain is not None and getter_type in plain:
+                return read(sub)
+            return match(sub, state, pl, card)
+        return _PRINTED, printed
+
 
 class PlayerPattern(Pattern):
     """Only matches to Player subjects. Subjects of any other
@@ -213,16 +347,16 @@ class VerbPattern(Pattern):
             return False
         if isinstance(self.pattern_for_player, Pattern):
             player_obj = state.player_list[subject.player]  # int->Player
-            if not self.pattern_for_player.match(
-                    player_obj, state, asking_player, asking_card):
+            if not self.pattern_for_player.compile()(
+                    player_obj, state, asking_player, asking_card, None):
                 return False
         if (isinstance(self.pattern_for_source, Pattern)
-                and not self.pattern_for_source.match(
-                subject.source, state, asking_player, asking_card)):
+                and not self.pattern_for_source.compile()(
+                subject.source, state, asking_player, asking_card, None)):
             return False
         if (isinstance(self.pattern_for_subject, Pattern)
-                and not self.pattern_for_subject.match(
-                subject.subject, state, asking_player, asking_card)):
+                and not self.pattern_for_subject.compile()(
+                subject.subject, state, asking_player, asking_card, None)):
             return False
         # if made it to here, there are no problems with the match so far!
         # call on the subclass's private match function to check for any
@@ -316,6 +450,14 @@ class CardType(CardPattern):
         its_types = Get.CardTypes().get(state, asking_player, subject)
         return self.type_to_match in its_types
 
+    def get_aggregate_key(self) -> tuple | None:
+        return Get.CardTypes, self.type_to_match
+
+    def _compile(self) -> Tuple[int, Callable]:
+        card_type = self.type_to_match
+        return self._compile_printed(
+            Get.CardTypes, lambda sub: card_type in sub.rules_text.cardtypes)
+
     def __str__(self):
         return "is-" + self.type_to_match
 
@@ -328,6 +470,14 @@ class Keyword(CardPattern):
         its_keywords = Get.Keywords().get(state, asking_player, subject)
         return self.keyword_to_match in its_keywords
 
+    def get_aggregate_key(self) -> tuple | None:
+        return Get.Keywords, self.keyword_to_match
+
+    def _compile(self) -> Tuple[int, Callable]:
+        keyword = self.keyword_to_match
+        return self._compile_printed(
+            Get.Keywords, lambda sub: keyword in sub.rules_text.keywords)
+
     def __str__(self):
         return "has-" + self.keyword_to_match
 
@@ -340,11 +490,21 @@ class Name(CardPattern):
         its_name = Get.CardName().get(state, asking_player, subject)
         return self.name_to_match == its_name
 
+    def get_aggregate_key(self) -> tuple | None:
+        return Get.CardName, self.name_to_match
+
+    def _compile(self) -> Tuple[int, Callable]:
+        name = self.name_to_match
+        return self._compile_printed(
+            Get.CardName, lambda sub: sub.rules_text.name == name)
+
     def __str__(self):
         return "named-" + self.name_to_match
 
 
 class Counter(CardPattern):
+    _cost = _CHEAP
+
     def __init__(self, counter_to_match: str):
         self.counter_to_match = counter_to_match
 
@@ -357,15 +517,24 @@ class Counter(CardPattern):
 
 class Tapped(CardPattern):
     def _match(self, subject: Cardboard, state, asking_player, asking_card):
-        return Get.IsTapped().get(state, asking_player, asking_card)
+        return Get.IsTapped().get(state, asking_player, subject)
+
+    def _compile(self) -> Tuple[int, Callable]:
+        return self._compile_printed(Get.IsTapped, lambda sub: sub.tapped)
 
 
 class Untapped(CardPattern):
     def _match(self, subject: Cardboard, state, asking_player, asking_card):
-        return not Get.IsTapped().get(state, asking_player, asking_card)
+        return not Get.IsTapped().get(state, asking_player, subject)
+
+    def _compile(self) -> Tuple[int, Callable]:
+        return self._compile_printed(Get.IsTapped,
+                                     lambda sub: not sub.tapped)
 
 
 class IsInZone(CardPattern):
+    _cost = _CHEAP
+
     def __init__(self, zone: Type[Zone.Zone]):
         self.zone: Type[Zone.Zone] = zone
 
@@ -378,30 +547,40 @@ class IsInZone(CardPattern):
 
 class IsSelf(CardPattern):
     """The subject Cardboard is the asking_card"""
+    _cost = _CHEAP
+
     def _match(self, subject: Cardboard, state, asking_player, asking_card):
         return subject is asking_card
 
 
 class Another(CardPattern):
     """The subject Cardboard is not the asking_card"""
+    _cost = _CHEAP
+
     def _match(self, subject: Cardboard, state, asking_player, asking_card):
         return subject is not asking_card
 
 
 class YouControl(CardPattern):
     """The asking asking_player controls the given Cardboard"""
+    _cost = _CHEAP
+
     def _match(self, subject: Cardboard, state, asking_player, asking_card):
         return subject.player_index == asking_player
 
 
 class OppControls(CardPattern):
     """The asking_player does not control the subject Cardboard"""
+    _cost = _CHEAP
+
     def _match(self, subject: Cardboard, state, asking_player, asking_card):
         return subject.player_index != asking_player
 
 
 class ControllerControls(CardPattern):
     """The controller of the asking_card also controls the subject Cardboard"""
+    _cost = _CHEAP
+
     def _match(self, subject: Cardboard, state, asking_player, asking_card):
         return subject.player_index == asking_card.player_index
 
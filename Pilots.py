@@ -6,18 +6,65 @@ Created on Mon Dec 28 21:13:59 2020
 """
 
 from typing import List
-import itertools
 # import tkinter.filedialog
 import tkinter as tk
 
 import Verbs
 import Times
+from Cardboard import Cardboard
 
 
 class AbortChoiceError(Exception):
     pass
 
 
+def _equivalence_key(option):
+    """Options with the same key are interchangeable. Cardboards
+    are keyed by their id (see `Cardboard.is_equiv_to`), tuples
+    by the keys of their elements. Anything else is only ever
+    equivalent to itself."""
+    if isinstance(option, Cardboard):
+        return option.get_id()
+    elif isinstance(option, tuple):
+        return tuple([_equivalence_key(o) for o in option])
+    else:
+        return id(option)
+
+
+def group_equivalent(options: list | tuple) -> List[list]:
+    """Sorts the options into lists of interchangeable options.
+    The groups are in order of their first option."""
+    groups = {}
+    for opt in options:
+        groups.setdefault(_equivalence_key(opt), []).append(opt)
+    return list(groups.values())
+
+
+def distinct_combinations(options: list | tuple, num_to_choose: int
+                          ) -> List[tuple]:
+    """
+    Like itertools.combinations, except that equivalent options
+    are treated as a multiset: each distinct selection is only
+    returned once, using the earliest of the equivalent options.
+    For example, choosing 2 of (A, B1, B2) gives (A, B1) and
+    (B1, B2) but not (A, B2). If all options are distinct, gives
+    exactly the same list as itertools.combinations.
+    """
+    groups = group_equivalent(options)
+
+    def combos(start: int, num: int):
+        if num == 0:
+            yield ()
+            return
+        for ii in range(start, len(groups)):
+            # take k copies of this group. more copies sorts first.
+            for k in range(min(num, len(groups[ii])), 0, -1):
+                for rest in combos(ii + 1, num - k):
+                    yield tuple(groups[ii][:k]) + rest
+
+    return list(combos(0, num_to_choose))
+
+
 class Pilot:
     def __init__(self):
         # untap+upkeep, draw, main1, combat, main2, endstep, cleanup.
@@ -33,6 +80,16 @@ class Pilot:
             True, True, False, False, False, False, False]
         self.respond_in_opp_phase = [
             False, False, False, False, False, False, False]
+        # Don't bother activating mana abilities if no amount of mana could
+        # let me cast anything new (see Player.could_use_more_mana). Makes
+        # the search much smaller, but never floats mana for its own sake.
+        self.skip_useless_mana = False
+        # Only activate mana abilities as part of casting a spell, with the
+        # spell's cost paid in each minimal way (see Player.get_auto_tap_plans)
+        # so mana is never left floating, e.g. to respond with later. Mana
+        # abilities are still offered alone if another activated ability
+        # costs mana, or if some mana ability's cost isn't understood.
+        self.auto_tap = False
 
 
     def choose_exactly_one(self, options: list | tuple,
@@ -196,15 +253,15 @@ class Pilot:
 class BotTriesAll(Pilot):
     def choose_exactly_one(self, options: list | tuple,
                            source_name: str = "Choose from:") -> list:
-        return options
+        # one of each kind of equivalent option
+        return [group[0] for group in group_equivalent(options)]
 
     def choose_exactly_n(self, options: list | tuple, num_to_choose: int,
                          source_name="Choose from:") -> List[tuple]:
         if num_to_choose > len(options):
             num_to_choose = len(options)
-        # exactly N only
-        return list(itertools.combinations(options, num_to_choose))
-        # I should remove duplicates HERE (rather than where Choice gets used
+        # exactly N only. equivalent options are interchangeable.
+        return distinct_combinations(options, num_to_choose)
 
     def choose_n_or_fewer(self, options: list | tuple, num_to_choose: int,
                           source_name: str = "Choose from:") -> List[tuple]:
@@ -216,7 +273,7 @@ class BotTriesAll(Pilot):
         if num_to_choose == 0:
             return [()]
         # recurse: Get all pairs of size exactly N, plus all shorter pairs
-        exactly_n = list(itertools.combinations(options, num_to_choose))
+        exactly_n = distinct_combinations(options, num_to_choose)
         return exactly_n + self.choose_n_or_fewer(options, num_to_choose - 1,
                                                   source_name)
 
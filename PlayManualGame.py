@@ -86,7 +86,7 @@ class ManualGame(tk.Tk):
                  ).grid(row=2, column=1, padx=5, pady=0)
         tk.Label(status_frame, text="Cards in hand: %i" % len(player.hand),
                  bg=color).grid(row=3, column=1, padx=5, pady=0)
-        tk.Label(status_frame, text="Cards in deck: %i" % len(player.deck),
+        tk.Label(status_frame, text="Cards in deck: %i" % player.deck_size,
                  bg=color).grid(row=4, column=1, padx=5, pady=0)
         tk.Label(status_frame, text="Cards in grave: %i" % len(player.grave),
                  bg=color).grid(row=5, column=1, padx=5, pady=0)
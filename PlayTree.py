@@ -5,10 +5,259 @@ Created on Mon Dec 28 21:13:59 2020
 @author: Cobi
 """
 from __future__ import annotations
-from typing import List, Set
+from typing import Callable, Dict, List, Tuple
+from collections import OrderedDict, Counter
+import heapq
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 
 from GameState import GameState
 from Times import Phase
+from Verbs import NullVerb
+
+# the state a GameState was reached from, whether that state had done its
+# special phase actions yet, and the action that led from one to the other
+_Parent = Tuple[GameState | None, bool, str]
+
+
+class TranspositionTable:
+    """
+    Remembers which GameStates a PlayTree has already seen, across
+    all phases and turns, so that no position is explored twice.
+    Each state is stored with flags marking what has been done
+    with it: EXPANDED (given to the priority player to act on) or
+    TRACKED (stored in the PlayTree's results).
+    The table holds at most `max_size` states. When it is full,
+    a state is evicted according to `eviction`:
+        "lru": evict the least-recently used state.
+        "depth": evict the least-recently used state from the
+            earliest turn and phase. The tree only moves forward
+            in time, so old positions are least likely to recur.
+    An evicted state may end up being explored again, which costs
+    time but gives the same results.
+    A state with a `commute_key` is only partly expanded: mana
+    abilities which commute and sort before that key are skipped.
+    So it only counts as EXPANDED for later copies of the state
+    whose key is at least as big (see GameState.commute_key).
+    """
+
+    EXPANDED = 1
+    TRACKED = 2
+    PARTLY_EXPANDED = 4
+
+    def __init__(self, max_size: int = 1000000, eviction: str = "lru"):
+        if eviction not in ("lru", "depth"):
+            raise ValueError("unknown eviction policy %s" % eviction)
+        self.max_size: int = max_size
+        self.eviction: str = eviction
+        # buckets of states, each in least-to-most recently used order.
+        # "lru" uses a single bucket, "depth" has one per (turn, phase).
+        self._buckets: Dict[Tuple[int, int] | None,
+                            OrderedDict[GameState, int]] = {}
+        # smallest commute_key each PARTLY_EXPANDED state was expanded with
+        self._partial_keys: Dict[GameState, str] = {}
+        self._size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self):
+        return self._size
+
+    def _bucket_key(self, state: GameState) -> Tuple[int, int] | None:
+        if self.eviction == "depth":
+            return state.total_turns, state.phase
+        else:
+            return None
+
+    def check(self, state: GameState, flag: int) -> bool:
+        """Returns whether the state is in the table with the
+        given flag. Counts towards the hit rate."""
+        bucket = self._buckets.get(self._bucket_key(state))
+        if bucket is not None and self._has_flag(state, bucket.get(state, 0),
+                                                 flag):
+            self.hits += 1
+            bucket.move_to_end(state)
+            return True
+        self.misses += 1
+        return False
+
+    def _has_flag(self, state: GameState, flags: int, flag: int) -> bool:
+        if flags & flag:
+            return True
+        # a partial expansion covers this state if it skipped no more
+        return (flag == TranspositionTable.EXPANDED
+                and flags & TranspositionTable.PARTLY_EXPANDED
+                and state.commute_key is not None
+                and self._partial_keys[state] <= state.commute_key)
+
+    def mark(self, state: GameState, flag: int):
+        """MUTATES. Adds the state to the table (if it isn't
+        already there) with the given flag. May evict others."""
+        bucket = self._buckets.setdefault(self._bucket_key(state),
+                                          OrderedDict())
+        if (flag == TranspositionTable.EXPANDED
+                and state.commute_key is not None):
+            flag = TranspositionTable.PARTLY_EXPANDED
+            old_key = self._partial_keys.get(state, state.commute_key)
+            self._partial_keys[state] = min(old_key, state.commute_key)
+        flags = bucket.get(state)
+        if flags is None:
+            bucket[state] = flag
+            self._size += 1
+            while self._size > self.max_size:
+                self._evict()
+        else:
+            bucket[state] = flags | flag
+            bucket.move_to_end(state)
+
+    def claim_expansion(self, state: GameState,
+                        mutable: bool = False) -> bool:
+        """MUTATES. Returns False if the state has already been
+        EXPANDED. Otherwise, marks it as EXPANDED and returns True.
+        If the state is `mutable` (about to be mutated and rewound),
+        a frozen StateKey is stored instead of the state itself.
+        If it was only partly
+        expanded before, sets the state's `commute_limit` so that
+        only the mana abilities skipped last time get tried."""
+        if self.check(state, TranspositionTable.EXPANDED):
+            return False
+        limit = self._partial_keys.get(state)
+        self.mark(state.get_key() if mutable else state,
+                  TranspositionTable.EXPANDED)
+        state.commute_limit = limit
+        return True
+
+    def _evict(self):
+        key = min(self._buckets) if self.eviction == "depth" else None
+        state, _ = self._buckets[key].popitem(last=False)
+        self._partial_keys.pop(state, None)
+        if len(self._buckets[key]) == 0:
+            del self._buckets[key]
+        self._size -= 1
+        self.evictions += 1
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+
+class DominanceFilter:
+    """
+    Finds GameStates which are strictly worse than another GameState
+    already seen: identical except for some "monotone" features where
+    more is always at least as good. Which features count is chosen
+    from:
+        "mana": mana floating in each player's pool, by color.
+        "life": each player's life total.
+        "untapped": each player's untapped permanents.
+        "hand": the cards in each player's hand. A hand is only at
+            least as good as another if it holds every card of the
+            other hand, so a bigger hand of different cards doesn't
+            count as better. Even then, an extra card isn't better
+            for every deck (e.g. when discarding down to hand size
+            matters), so this one is left out of DEFAULT_FEATURES.
+    For example, with "mana" and "untapped", a state with an extra
+    untapped Forest dominates the same state where the Forest was
+    tapped and the mana then spent.
+    States are indexed by everything EXCEPT those features, so each
+    state is only compared against the few states in its own bucket
+    which aren't themselves dominated.
+    """
+
+    FEATURES = ("mana", "life", "untapped", "hand")
+    DEFAULT_FEATURES = ("mana", "life", "untapped")
+
+    def __init__(self, features: List[str] | Tuple[str, ...]
+                 = DEFAULT_FEATURES):
+        for feature in features:
+            if feature not in DominanceFilter.FEATURES:
+                raise ValueError("unknown dominance feature %s" % feature)
+        self.features = tuple(features)
+        # signature -> list of the non-dominated feature-Counters seen so far
+        self._index: Dict[tuple, List[Counter]] = {}
+        self.num_dominated: int = 0
+
+    def __len__(self):
+        return sum([len(front) for front in self._index.values()])
+
+    def clear(self):
+        """MUTATES. Forgets all the states seen so far."""
+        self._index = {}
+
+    def _split(self, state: GameState) -> Tuple[tuple, Counter]:
+        """Returns the signature of the state (everything which
+        isn't a monotone feature) and the Counter of its monotone
+        features."""
+        signature = [state.active_player_index, state.priority_player_index,
+                     state.phase, tuple([c.get_id() for c in state.stack]),
+                     tuple([c.get_id() for c in state.super_stack])]
+        features = Counter()
+        for p in state.player_list:
+            signature += [p.victory_status, p.turn_count, p.num_lands_played,
+                          p.num_spells_cast, p.deck_size,
+                          tuple([c.get_id() for c in p.grave])]
+            ii = p.player_index
+            if "life" in self.features:
+                features[("life", ii)] = p.life
+            else:
+                signature.append(p.life)
+            if "mana" in self.features:
+                for color, amount in zip(p.pool.color_list, p.pool.data):
+                    features[("mana", ii, color)] = amount
+            else:
+                signature.append(str(p.pool))
+            if "hand" in self.features:
+                for card in p.hand:
+                    features[("hand", ii, card.get_id())] += 1
+            else:
+                signature.append(tuple([c.get_id() for c in p.hand]))
+            if "untapped" in self.features:
+                field = []
+                for card in p.field:
+                    key = card.get_id(ignore_tapped=True)
+                    field.append(key)
+                    if not card.tapped:
+                        features[("untapped", ii, key)] += 1
+                signature.append(tuple(sorted(field)))
+            else:
+                signature.append(tuple([c.get_id() for c in p.field]))
+        return tuple(signature), features
+
+    def is_dominated(self, state: GameState) -> bool:
+        """MUTATES. Returns True if the state is strictly worse
+        than a state already in the filter. Otherwise, adds the
+        state to the filter (removing any states it dominates)
+        and returns False."""
+        return self._is_dominated(*self._split(state))
+
+    def _is_dominated(self, signature: tuple, features: Counter) -> bool:
+        front = self._index.setdefault(signature, [])
+        for other in front:
+            # Counters compare as multisets, so this checks each card in
+            # hand (or untapped permanent) by id, not just how many.
+            if features <= other:
+                # other is at least as good everywhere. Equal features
+                # mean an equal state, which counts as nothing new.
+                self.num_dominated += 1
+                return True
+        front[:] = [other for other in front if not other <= features]
+        front.append(features)
+        return False
+
+    def filter(self, states: List[GameState]) -> List[GameState]:
+        """MUTATES. Returns the states which aren't dominated by
+        any other state in the list (or already in the filter).
+        Doesn't depend on the order of the list."""
+        keyed = [(self._split(st), st) for st in states]
+        # a state can only be dominated by a state with a bigger total, so
+        # adding biggest-first means no kept state is later dominated. It
+        # may still dominate states kept by earlier calls, which are then
+        # dropped from the filter.
+        keyed.sort(key=lambda pair: -sum(pair[0][1].values()))
+        return [state for (signature, features), state in keyed
+                if not self._is_dominated(signature, features)]
 
 
 class PlayTree:
@@ -17,7 +266,13 @@ class PlayTree:
     Stores the initial states, the final states, and all intermediate states.
     """
 
-    def __init__(self, start_states: List[GameState], turn_limit: int):
+    def __init__(self, start_states: List[GameState], turn_limit: int,
+                 in_place: bool = False, table_size: int = 1000000,
+                 eviction: str = "lru", num_workers: int = 1,
+                 heuristic: Callable[[GameState], float] | None = None,
+                 beam_width: int | Dict[Phase, int] | None = None,
+                 max_frontier: int | None = None,
+                 dominance: List[str] | Tuple[str, ...] | None = None):
         """
         The structures to hold historical GameStates are:
               _active_states:
@@ -39,20 +294,70 @@ class PlayTree:
                   list (turn of game) of list of states where the game has
                   ended. Indexed as _game_over_states[turn][index].
                   Superstack and normal stack may not be empty.
+        If `in_place`, phases are explored depth-first by mutating and
+        rewinding GameStates rather than copying them. Same results.
+        All GameStates seen are remembered in a TranspositionTable with
+        the given size and eviction policy, to avoid repeating work.
+        If `num_workers` is more than 1, phases are explored in parallel
+        by that many worker processes. Call `close` when done.
+        If a `heuristic` is given, phases are explored best-first
+        instead: the GameState with the highest score is always the
+        next one to be acted on. Completeness can then be traded for
+        bounded time and memory:
+            `beam_width`: at most this many GameStates (the highest
+                scoring ones) are kept at the end of each phase.
+                Either a single number or a dict of phase to number
+                (phases not in the dict are not limited).
+            `max_frontier`: at most this many GameStates are waiting
+                to be acted on at once. The lowest scoring ones are
+                thrown away to make room.
+        If `dominance` is a list of features (see DominanceFilter),
+        then within each phase, any GameState which is strictly worse
+        than another on those features is thrown away.
+        Best-first and dominance can't be combined with `in_place` or
+        `num_workers`.
         """
+        if (heuristic is not None or dominance is not None) and (
+                in_place or num_workers > 1):
+            raise ValueError("best-first search and dominance only work"
+                             " when copying states in a single process")
         self.turn_limit = turn_limit  # max number of turns this will test
+        self.in_place: bool = in_place
+        self.table = TranspositionTable(table_size, eviction)
+        self.num_workers: int = num_workers
+        self._pool: ProcessPoolExecutor | None = None  # made when needed
+        self.heuristic = heuristic
+        self.beam_width = beam_width
+        self.max_frontier: int | None = max_frontier
+        self.num_pruned: int = 0  # states thrown away by beam or frontier
+        self.dominance = dominance
+        self.num_dominated: int = 0  # states thrown away by dominance
+        if dominance is not None:
+            DominanceFilter(dominance)  # to check that the features exist
         self._active_states: List[List[List[GameState]]] = []
         # self._out_of_option_states: List[List[GameState]] = []
         self._game_over_states: List[List[GameState]] = []
+        self._start_states: List[GameState] = []
+        # every state in this tree shares one new cache of valid actions
+        GameState.reset_caches(start_states)
         # prep the start states. if turn 0, advance to turn 1 as untap
         for state in start_states:
             if state.total_turns == 0:
                 state = state.copy()
                 state.active_player_index -= 1  # so pass_turn won't change it.
                 state.pass_turn()
+            self._start_states.append(state)
             self.track_this_state(state)
 
-    def track_this_state(self, state: GameState):
+    def track_this_state(self, state: GameState, needs_copy: bool = False):
+        """Stores the state in the results, unless an equivalent
+        state has already been stored. If `needs_copy`, stores a
+        copy of the state instead (only made if it's stored)."""
+        if self.table.check(state, TranspositionTable.TRACKED):
+            return
+        if needs_copy:
+            state = state.copy()
+        self.table.mark(state, TranspositionTable.TRACKED)
         # make sure trackers have enough slots. all are same length.
         while len(self._active_states) <= state.total_turns:
             # for _active_states, need one sub-list per phase
@@ -70,26 +375,281 @@ class PlayTree:
         Copies all states from the given turn and phase and plays them
         out until the players pass to the next phase.
         """
-        # all intermediate states, to avoid repeating work
-        intermeds: Set[GameState] = set()
+        if self.num_workers > 1:
+            return self.process_states_in_phase_parallel(phase, turn)
+        if self.in_place:
+            return self.process_states_in_phase_in_place(phase, turn)
+        if self.heuristic is not None:
+            return self.process_states_in_phase_best_first(phase, turn)
+        dominance = self._new_dominance_filter()
         # all states still in this phase that still need to be processed.
         in_progress: List[GameState] = []
+        # states which reached the next phase, if they need to be filtered
+        finished: List[GameState] = []
         for st in self._active_states[turn][phase]:
             # start by doing any automatic phase actions
-            intermeds.update(PlayTree.do_special_phase_thing(st))
-        # build from set in case special_phase_things caused any duplicates
-        in_progress = list(intermeds)
+            in_progress += PlayTree.do_special_phase_thing(st)
         while len(in_progress) > 0:
             # remove a GameState from the in-progress list and explore it
             state4: GameState = in_progress.pop()
             if state4.phase != phase or state4.game_over:
                 # new phase and/or game is over, so done processing this state
-                self.track_this_state(state4)
-            else:
+                if dominance is not None and not state4.game_over:
+                    finished.append(state4)  # never prune finished games
+                else:
+                    self.track_this_state(state4)
+            elif dominance is not None and dominance.is_dominated(state4):
+                continue
+            elif self.table.claim_expansion(state4):
+                # give priority player a chance to act, then process again
+                in_progress += state4.do_priority_action()
+        self._track_undominated(finished, dominance)
+
+    def _new_dominance_filter(self) -> DominanceFilter | None:
+        if self.dominance is None:
+            return None
+        return DominanceFilter(self.dominance)
+
+    def _track_undominated(self, states: List[GameState],
+                           dominance: DominanceFilter | None):
+        """Tracks the states which aren't dominated by each other.
+        Tracks all of them if there's no DominanceFilter."""
+        if dominance is not None:
+            states = dominance.filter(states)
+            self.num_dominated += dominance.num_dominated
+        for state in states:
+            self.track_this_state(state)
+
+    def process_states_in_phase_best_first(self, phase: Phase,
+                                           turn: int = -1):
+        """
+        Same as `process_states_in_phase`, but the in-progress states
+        are kept in a priority queue ordered by `heuristic`, highest
+        score first. If `max_frontier` is set, the queue is trimmed
+        to that many states, and if the phase has a `beam_width`,
+        only that many of the states which reach the next phase are
+        kept. Pruned states are counted in `num_pruned`. Dominated
+        states are thrown away before the beam is applied.
+        """
+        dominance = self._new_dominance_filter()
+        if isinstance(self.beam_width, dict):
+            width = self.beam_width.get(phase)
+        else:
+            width = self.beam_width
+        # heap of (-score, tiebreak, state). the tiebreak is a counter so
+        # that equal scores come out first-in-first-out and GameStates
+        # never need to be compared to each other.
+        frontier: List[Tuple[float, int, GameState]] = []
+        count = 0
+        finished: List[Tuple[float, int, GameState]] = []
+        for st in self._active_states[turn][phase]:
+            # start by doing any automatic phase actions
+            for st2 in PlayTree.do_special_phase_thing(st):
+                frontier.append((-self.heuristic(st2), count, st2))
+                count += 1
+        heapq.heapify(frontier)
+        while len(frontier) > 0:
+            if self.max_frontier is not None and (len(frontier)
+                                                  > self.max_frontier):
+                self.num_pruned += len(frontier) - self.max_frontier
+                frontier = heapq.nsmallest(self.max_frontier, frontier)
+            # remove the best GameState from the frontier and explore it
+            item = heapq.heappop(frontier)
+            state4 = item[2]
+            if state4.game_over:
+                self.track_this_state(state4)  # never prune finished games
+            elif state4.phase != phase:
+                # new phase, so done processing this state
+                finished.append(item)
+            elif dominance is not None and dominance.is_dominated(state4):
+                continue
+            elif self.table.claim_expansion(state4):
                 # give priority player a chance to act, then process again
-                new_sts = state4.do_priority_action()
-                in_progress.extend([s for s in new_sts if s not in intermeds])
-                intermeds.update(new_sts)
+                for state5 in state4.do_priority_action():
+                    heapq.heappush(frontier,
+                                   (-self.heuristic(state5), count, state5))
+                    count += 1
+        finished = list({item[2]: item for item in finished}.values())
+        if dominance is not None:
+            kept = dominance.filter([item[2] for item in finished])
+            self.num_dominated += dominance.num_dominated
+            finished = [item for item in finished if item[2] in kept]
+        if width is not None and len(finished) > width:
+            self.num_pruned += len(finished) - width
+            finished = heapq.nsmallest(width, finished)
+        for item in finished:
+            self.track_this_state(item[2])
+
+    def process_states_in_phase_in_place(self, phase: Phase, turn: int = -1):
+        """
+        Same as `process_states_in_phase`, but explores depth-first
+        by mutating a single working GameState and rewinding it
+        after each action (see `GameState.do_priority_action_in_place`)
+        instead of copying it. The transposition table remembers the
+        states explored along the way by their StateKey, so only the
+        states which reach the next phase get copied.
+        """
+        for st in self._active_states[turn][phase]:
+            # start by doing any automatic phase actions
+            for st2 in PlayTree.do_special_phase_thing(st):
+                self._explore_in_place(st2, phase)
+
+    def _explore_in_place(self, state: GameState, phase: Phase):
+        """Depth-first helper for `process_states_in_phase_in_place`.
+        If `state` is new, explores all of its children. MUTATES
+        `state` but rewinds it afterwards."""
+        was_in_place = state.in_place_mode
+        state.in_place_mode = True  # so that copies take over history
+        try:
+            if state.phase != phase or state.game_over:
+                # new phase and/or game is over, so done processing this
+                self.track_this_state(state, needs_copy=True)
+                return
+            if not self.table.claim_expansion(state, mutable=True):
+                return
+            # give priority player a chance to act, then process again
+            for new_sts in state.do_priority_action_in_place():
+                for state2 in new_sts:
+                    self._explore_in_place(state2, phase)
+        finally:
+            state.in_place_mode = was_in_place
+
+    def process_states_in_phase_parallel(self, phase: Phase, turn: int = -1):
+        """
+        Same as `process_states_in_phase`, but spreads the work
+        across `num_workers` processes. The states to explore are
+        sharded by a digest of their id, so each worker owns one
+        slice of the possible states. A worker keeps exploring the
+        new states in its own slice (checking for duplicates itself),
+        and hands any states from other slices back here, to be
+        checked against the transposition table and sent out again in
+        the next round. Repeats until no states are left in the phase.
+        """
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.num_workers)
+        frontier: List[GameState] = []
+        for st in self._active_states[turn][phase]:
+            # start by doing any automatic phase actions
+            frontier += PlayTree.do_special_phase_thing(st)
+        while len(frontier) > 0:
+            shards: List[List[GameState]] = [[] for _ in
+                                             range(self.num_workers)]
+            for state in frontier:
+                if state.phase != phase or state.game_over:
+                    # new phase and/or game is over, so done with this state
+                    self.track_this_state(state)
+                elif self.table.claim_expansion(state):
+                    shards[_shard_of(state, self.num_workers)].append(state)
+            futures = [self._pool.submit(_explore_shard, shard, ii,
+                                         self.num_workers, phase)
+                       for ii, shard in enumerate(shards) if len(shard) > 0]
+            frontier = []
+            for future in futures:
+                done, handed_back = future.result()
+                for state in done:
+                    self.track_this_state(state)
+                frontier += handed_back
+
+    def search(self, goal: Callable[[GameState], bool],
+               turn_limit: int | None = None
+               ) -> List[Tuple[str, GameState]] | None:
+        """
+        Plays forward from the start states, depth-first, looking
+            for any GameState where `goal` returns True. Stops as soon
+            as it finds one. Doesn't go past `turn_limit` (total turns
+            of the game), or past the PlayTree's turn limit if None.
+        Returns the path to that GameState as a list of (action,
+            GameState) pairs, where action is a description of what
+            was done to reach that GameState. The first pair is a
+            start state. Returns None if the goal can't be reached.
+        Doesn't touch the PlayTree's stored states.
+        """
+        if turn_limit is None:
+            turn_limit = self.turn_limit
+        # each GameState we reach is mapped to its _Parent. Same for the
+        # states which still need their special phase actions done (untap,
+        # draw, etc).
+        parents: Dict[GameState, _Parent] = {}
+        parents_unstarted: Dict[GameState, _Parent] = {}
+        # states to explore, and whether they've done special phase actions
+        in_progress: List[Tuple[GameState, bool]] = []
+        # a state reached again may still need exploring, if it now skips
+        # fewer mana abilities (see GameState.commute_key)
+        expanded = TranspositionTable()
+        for state in self._start_states:
+            if goal(state):
+                return [("start", state)]
+            parents_unstarted[state] = (None, False, "start")
+            in_progress.append((state, False))
+        while len(in_progress) > 0:
+            state, is_started = in_progress.pop()
+            # find all the actions that can be done from here
+            if is_started:
+                choices = [("pass priority" if isinstance(to_do, NullVerb)
+                            else str(to_do), state.do_action(to_do))
+                           for to_do in state.get_priority_actions()]
+            else:
+                choices = [("%s step" % state.phase.name,
+                            PlayTree.do_special_phase_thing(state))]
+            # depth-first pops the last choice first. Push the choices in
+            # reverse, so that the pilot's first choices get tried first and
+            # passing priority gets tried last.
+            for text, results in choices[::-1]:
+                for state2 in results:
+                    # if phase changes, need to do the new phase's actions.
+                    # special phase actions can't change the phase unless
+                    # they pass to a new turn, which starts a new phase too.
+                    is_started2 = (state2.phase == state.phase
+                                   and state2.total_turns == state.total_turns)
+                    tracker = parents if is_started2 else parents_unstarted
+                    if is_started2:
+                        if not expanded.claim_expansion(state2):
+                            continue
+                    elif state2 in tracker:
+                        continue
+                    tracker.setdefault(state2, (state, is_started, text))
+                    if goal(state2):
+                        return PlayTree._path_to(state2, is_started2, parents,
+                                                 parents_unstarted)
+                    if (not state2.game_over
+                            and state2.total_turns <= turn_limit):
+                        in_progress.append((state2, is_started2))
+        return None
+
+    @staticmethod
+    def _path_to(state: GameState, is_started: bool,
+                 parents: Dict[GameState, _Parent],
+                 parents_unstarted: Dict[GameState, _Parent]
+                 ) -> List[Tuple[str, GameState]]:
+        """Follows the parent maps from `search` back to the start
+        state, and returns the path from there to `state`."""
+        path = []
+        while state is not None:
+            tracker = parents if is_started else parents_unstarted
+            parent, is_started, text = tracker[state]
+            path.append((text, state))
+            state = parent
+        return path[::-1]
+
+    def close(self):
+        """Shuts down the worker processes, if there are any."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def get_stats(self) -> Dict[str, int | float]:
+        """Summary numbers about the tree and its transposition
+        table, for profiling."""
+        return {"num_active": sum([len(sub) for turn in self._active_states
+                                   for sub in turn]),
+                "num_finished": sum([len(t) for t in self._game_over_states]),
+                "table_size": len(self.table),
+                "table_hits": self.table.hits,
+                "table_misses": self.table.misses,
+                "table_hit_rate": self.table.hit_rate,
+                "table_evictions": self.table.evictions,
+                "num_pruned": self.num_pruned,
+                "num_dominated": self.num_dominated}
 
     @staticmethod
     def do_special_phase_thing(state: GameState) -> List[GameState]:
@@ -198,3 +758,39 @@ class PlayTree:
         specified turn. If turn is -1, gets the states from
         the latest turn instead."""
         return list(self._game_over_states[turn])
+
+
+def _shard_of(state: GameState, num_shards: int) -> int:
+    """Which shard the GameState belongs to. Not based on `hash`,
+    since str hashes (and so GameState hashes) differ between worker
+    processes which don't share a hash seed."""
+    digest = hashlib.blake2b(state.get_id().encode(), digest_size=8)
+    return int.from_bytes(digest.digest(), "little") % num_shards
+
+
+def _explore_shard(states: List[GameState], shard: int, num_shards: int,
+                   phase: Phase) -> Tuple[List[GameState], List[GameState]]:
+    """
+    Runs in a worker process for `PlayTree.process_states_in_phase_parallel`.
+    Explores the given states, and any new states they lead to which are
+    in the same shard (see `_shard_of`), until they leave the phase.
+    Returns the states that left the phase (or ended the game), and the
+    states in the phase which belong to other shards.
+    """
+    done: List[GameState] = []
+    handed_back: List[GameState] = []
+    seen = TranspositionTable()
+    GameState.reset_caches(states)
+    for state in states:
+        seen.mark(state, TranspositionTable.EXPANDED)  # claimed by the tree
+    in_progress = list(states)
+    while len(in_progress) > 0:
+        state = in_progress.pop()
+        for state2 in state.do_priority_action():
+            if state2.phase != phase or state2.game_over:
+                done.append(state2)
+            elif _shard_of(state2, num_shards) != shard:
+                handed_back.append(state2)
+            elif seen.claim_expansion(state2):
+                in_progress.append(state2)
+    return done, handed_back
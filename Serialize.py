@@ -0,0 +1,527 @@
+from __future__ import annotations
+from typing import Dict, List, Tuple, Type
+import io
+import pickle
+import struct
+
+from GameState import GameState, Player
+from Cardboard import Cardboard
+from ManaHandler import ManaPool
+from Stack import StackObject
+import RulesText
+import Abilities
+import Decklist
+import Pilots
+import Times
+import Verbs
+import Zone
+
+# Compact binary encoding of a GameState. Much smaller and faster than
+# pickling, since it only writes down what's in the GameState's ID: no
+# history, no Pilots, no Holders. The Holders for triggers and statics are
+# rebuilt when the permanents are put back onto the field.
+#
+# Layout. (u) is an unsigned varint: 7 bits per byte, lowest first, with
+# the top bit set on every byte but the last. (s) is a signed varint,
+# zigzagged (0, -1, 1, -2, ...) into a (u). (B) is a single byte.
+#   header:   b"MTGW", version (B)
+#   strings:  number of distinct strings (u), then each one as length (u)
+#             + utf-8 text. Counters, Verb and Zone class names, and any
+#             str inputs of Verbs refer to these by index.
+#   state:    num players (u), active player (u), priority player (u),
+#             phase (u), stack length (u), super_stack length (u)
+#   player:   turn (u), life (s), lands played (u), spells cast (u),
+#             victory status (u), mana pool (7u, in ManaPool.color_list
+#             order), then deck, hand, field, grave.
+#   zone:     number of cards (u), then for each card:
+#             RulesText id (u), flags (B: 1=tapped, 2=summon_sick),
+#             owner + 1 (u), number of distinct counters (u), then
+#             (counter index (u), count (u)) for each distinct counter.
+#   stack:    one StackObject per item, bottom first: class name (u),
+#             controller (u), then its obj, pay_cost and do_effect as
+#             values (see below).
+#   super:    one value (a caster Verb) per item of the super_stack.
+#
+# The deck is written in order (bottom first). The other zones are kept
+# sorted by the Player, so their order doesn't matter.
+#
+# A value is a tag (B) followed by its data (see `_write_value`). Verbs
+# are written as their class name plus all of their fields, and refer to
+# Cardboards by zone and location, so the decoded Verbs point at the
+# decoded Cardboards. Abilities of registered cards are written as where
+# to find them in the card's RulesText. Anything else a Verb holds
+# (Getters, Patterns) never points at a Cardboard, so it can be pickled,
+# but only if the caller allows it (see `encode`).
+#
+# Versions 1 and 2 used fixed-width fields instead of varints: B for
+# small counts, H for the turn, zone sizes, ids and string indexes, h for
+# life, i for ints. Version 1 had no stack. Both still decode.
+
+VERSION = 3
+_MAGIC = b"MTGW"
+_VICTORY = ["", "W", "L"]
+
+# tags for the values in the stack and super_stack
+_NONE = 0
+_FALSE = 1
+_TRUE = 2
+_INT = 3  # int (s)
+_STR = 4  # string index (u)
+_CARD = 5  # zone (u, see _ZONE_LISTS), player (u), location (u)
+_NEW_CARD = 6  # a card on the stack, written out in full
+_STACK_REF = 7  # index (u) of a StackObject already on the stack
+_STACK_OBJ = 8  # a StackObject not on the stack, written out in full
+_VERB = 9  # class name (u), num_inputs (u), flags (B), then values
+_ZONE = 10  # class name (u), then player and location as values
+_SLICE = 11  # start, stop, step as values
+_LIST = 12  # length (u), then values
+_TUPLE = 13  # length (u), then values
+_PICKLED = 14  # length (u), then pickled bytes
+_ABILITY = 15  # RulesText id (u), list (u, see _ABILITY_LISTS), index (u)
+_ZONE_LISTS = ["deck", "hand", "field", "grave"]
+_ABILITY_LISTS = ["activated", "trig_verb", "trig_timed"]
+
+# RulesText classes, by id. ONLY EVER APPEND TO THIS LIST! The ids are
+# written into encoded GameStates, so reordering breaks old encodings.
+_REGISTRY: List[Type[RulesText.RulesText]] = []
+_IDS: Dict[Type[RulesText.RulesText], int] = {}
+# one shared instance per RulesText class. RulesText never mutates.
+_INSTANCES: Dict[Type[RulesText.RulesText], RulesText.RulesText] = {}
+# where to find each ability of the registered RulesTexts, by the
+# ability's text. see `_get_ability_ids`.
+_ABILITY_IDS: Dict[str, Tuple[int, int, int]] = {}
+
+
+def register(rules_class: Type[RulesText.RulesText]) -> int:
+    """Gives the RulesText class a permanent id for encoding. If
+    it already has one, returns that instead."""
+    if rules_class not in _IDS:
+        _IDS[rules_class] = len(_REGISTRY)
+        _REGISTRY.append(rules_class)
+        _ABILITY_IDS.clear()  # rebuilt to include the new abilities
+    return _IDS[rules_class]
+
+
+for _card in [Decklist.Roots, Decklist.Caryatid, Decklist.Caretaker,
+              Decklist.Battlement, Decklist.Axebane, Decklist.Blossoms,
+              Decklist.Omens, Decklist.Arcades, Decklist.Company,
+              Decklist.Forest, Decklist.Plains, Decklist.Island,
+              Decklist.Swamp, Decklist.Mountain, Decklist.TempleGarden,
+              Decklist.BreedingPool, Decklist.HallowedFountain,
+              Decklist.WindsweptHeath, Decklist.MistyRainforest,
+              Decklist.FloodedStrand]:
+    register(_card)
+
+
+class EncodingError(ValueError):
+    pass
+
+
+def encode(state: GameState, allow_pickle: bool = False) -> bytes:
+    """Returns the compact binary encoding of the GameState.
+    Raises EncodingError if the GameState has something which
+    can't be rebuilt: triggers and statics which don't simply
+    last as long as their permanent stays in play, unregistered
+    cards, or Verbs holding something which can't be written.
+    Verbs holding Getters or Patterns (e.g. Collected Company on
+    the stack) can only be written if `allow_pickle`, and then
+    the result can only be decoded with `allow_pickle` too."""
+    for h in (state.trig_event + state.trigs_to_remove + state.trig_timed
+              + state.statics + state.statics_to_remove):
+        if h.duration is not None:
+            raise EncodingError("can't encode temporary effect %s" % str(h))
+    writer = _Writer(state, allow_pickle)
+    for value in [len(state.player_list), state.active_player_index,
+                  state.priority_player_index, state.phase, len(state.stack),
+                  len(state.super_stack)]:
+        writer.uint(value)
+    for player in state.player_list:
+        writer.uint(player.turn_count)
+        writer.sint(player.life)
+        writer.uint(player.num_lands_played)
+        writer.uint(player.num_spells_cast)
+        writer.uint(_VICTORY.index(player.victory_status))
+        for amount in player.pool.data:
+            writer.uint(amount)
+        # deck_view, so that a shared deck doesn't get copied
+        for zone in [player.deck_view, player.hand, player.field,
+                     player.grave]:
+            writer.uint(len(zone))
+            for card in zone:
+                writer.card(card)
+    for obj in state.stack:
+        writer.stack_object(obj)
+    for caster in state.super_stack:
+        writer.value(caster)
+    header = _Writer(state, allow_pickle)
+    header.out += _MAGIC
+    header.out.append(VERSION)
+    header.uint(len(writer.strings))
+    for text in writer.strings:  # dicts keep insertion order, same as index
+        raw = text.encode("utf-8")
+        header.uint(len(raw))
+        header.out += raw
+    return bytes(header.out + writer.out)
+
+
+class _Writer:
+    """Builds up the bytes of an encoded GameState."""
+
+    def __init__(self, state: GameState, allow_pickle: bool):
+        self.state = state
+        self.allow_pickle = allow_pickle
+        self.out = bytearray()
+        self.strings: Dict[str, int] = {}
+
+    def uint(self, value: int):
+        if value < 0:
+            raise EncodingError("can't encode %i as unsigned" % value)
+        while value >= 0x80:
+            self.out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        self.out.append(value)
+
+    def sint(self, value: int):
+        self.uint(value * 2 if value >= 0 else -value * 2 - 1)
+
+    def string(self, text: str):
+        self.uint(self.strings.setdefault(text, len(self.strings)))
+
+    def card(self, card: Cardboard):
+        if type(card.rules_text) not in _IDS:
+            raise EncodingError("unregistered card %s" % card.name)
+        self.uint(_IDS[type(card.rules_text)])
+        self.out.append((1 if card.tapped else 0)
+                        | (2 if card.summon_sick else 0))
+        self.uint(card.owner_index + 1)
+        distinct = sorted(set(card.counters))
+        self.uint(len(distinct))
+        for text in distinct:
+            self.string(text)
+            self.uint(card.counters.count(text))
+
+    def stack_object(self, obj: StackObject):
+        self.string(type(obj).__name__)
+        self.uint(obj.player_index)
+        if isinstance(obj.obj, Cardboard) and isinstance(obj.obj.zone,
+                                                         Zone.Stack):
+            self.out.append(_NEW_CARD)
+            self.card(obj.obj)
+        else:
+            self.value(obj.obj)
+        self.value(obj.pay_cost)
+        self.value(obj.do_effect)
+
+    def value(self, value):
+        state = self.state
+        if value is None:
+            self.out.append(_NONE)
+        elif isinstance(value, bool):
+            self.out.append(_TRUE if value else _FALSE)
+        elif isinstance(value, int):
+            self.out.append(_INT)
+            self.sint(value)
+        elif isinstance(value, str):
+            self.out.append(_STR)
+            self.string(value)
+        elif isinstance(value, Cardboard):
+            self.out.append(_CARD)
+            for number in _get_card_location(value, state):
+                self.uint(number)
+        elif isinstance(value, StackObject):
+            if any([obj is value for obj in state.stack]):
+                self.out.append(_STACK_REF)
+                self.uint(value.zone.location)
+            else:
+                self.out.append(_STACK_OBJ)
+                self.stack_object(value)
+        elif isinstance(value, Verbs.Verb):
+            self.out.append(_VERB)
+            self.string(type(value).__name__)
+            self.uint(value.num_inputs)
+            self.out.append((1 if value.copies else 0)
+                            | (2 if value.is_populated else 0))
+            for field in [value.player, value.source, value.cause,
+                          value.subject, value.inputs, value.sub_verbs]:
+                self.value(field)
+        elif isinstance(value, Zone.Zone):
+            self.out.append(_ZONE)
+            self.string(type(value).__name__)
+            self.value(value.player)
+            self.value(value.location)
+        elif isinstance(value, slice):
+            self.out.append(_SLICE)
+            for field in [value.start, value.stop, value.step]:
+                self.value(field)
+        elif (isinstance(value, (Abilities.ActivatedAbility,
+                                 Abilities.TriggeredAbility,
+                                 Abilities.TimedAbility))
+              and str(value) in _get_ability_ids()):
+            # abilities get copied along with the GameState, so they can't
+            # be found by `is`. but the same text means an identical ability.
+            self.out.append(_ABILITY)
+            for number in _ABILITY_IDS[str(value)]:
+                self.uint(number)
+        elif isinstance(value, (list, tuple)):
+            self.out.append(_LIST if isinstance(value, list) else _TUPLE)
+            self.uint(len(value))
+            for item in value:
+                self.value(item)
+        elif self.allow_pickle:
+            raw = io.BytesIO()
+            _LeafPickler(raw).dump(value)
+            self.out.append(_PICKLED)
+            self.uint(len(raw.getvalue()))
+            self.out += raw.getvalue()
+        else:
+            raise EncodingError("can't encode %s without allow_pickle"
+                                % type(value).__name__)
+
+
+def _get_card_location(card: Cardboard, state: GameState
+                       ) -> Tuple[int, int, int]:
+    """Where the card is, as (zone, player, location). Cards on
+    the stack are found by their StackObject's index. The Verbs
+    of a StackObject may hold their own copy of its card rather
+    than the card itself, so those only need to be equivalent.
+    Either way, they decode to the StackObject's card."""
+    if isinstance(card.zone, Zone.Stack):
+        index = card.zone.location
+        if (index is not None and index < len(state.stack)
+                and isinstance(state.stack[index].obj, Cardboard)
+                and state.stack[index].obj.is_equiv_to(card)):
+            return len(_ZONE_LISTS), 0, index
+    for zone_index, name in enumerate(_ZONE_LISTS):
+        if (type(card.zone).__name__.lower() == name
+                and isinstance(card.zone.player, int)):
+            player = state.player_list[card.zone.player]
+            cards = (player.deck_view if name == "deck"
+                     else getattr(player, name))
+            index = card.zone.location
+            if index is not None and cards[index] is card:
+                return zone_index, card.zone.player, index
+    raise EncodingError("can't find %s in its zone" % repr(card))
+
+
+def _get_rules_text(rules_id: int) -> RulesText.RulesText:
+    rules_class = _REGISTRY[rules_id]
+    if rules_class not in _INSTANCES:
+        _INSTANCES[rules_class] = rules_class()
+    return _INSTANCES[rules_class]
+
+
+def _get_ability_ids() -> Dict[str, Tuple[int, int, int]]:
+    """Where to find every ability of every registered RulesText,
+    as (RulesText id, index into _ABILITY_LISTS, index into that
+    list), keyed by the ability's text."""
+    if len(_ABILITY_IDS) == 0:
+        for rules_id in range(len(_REGISTRY)):
+            rules = _get_rules_text(rules_id)
+            for list_index, name in enumerate(_ABILITY_LISTS):
+                for index, ability in enumerate(getattr(rules, name)):
+                    _ABILITY_IDS.setdefault(str(ability),
+                                            (rules_id, list_index, index))
+    return _ABILITY_IDS
+
+
+class _LeafPickler(pickle.Pickler):
+    """Pickles the constant parts of Verbs. Refuses anything which
+    points back into a GameState, since that wouldn't be rebuilt
+    as part of the decoded GameState."""
+
+    def persistent_id(self, obj):
+        if isinstance(obj, (Cardboard, StackObject, GameState, Player)):
+            raise EncodingError("can't encode pointer to %s" % str(obj))
+        return None
+
+
+def decode(data: bytes, pilots: List[Pilots.Pilot] | None = None,
+           allow_pickle: bool = False) -> GameState:
+    """Rebuilds a GameState from `encode`. The Players get the
+    given pilots if any, otherwise the default. The new GameState
+    is not tracking history.
+    Raises EncodingError if the data has pickled parts, unless
+    `allow_pickle`. Only allow that for data from a trusted
+    source (such as this program itself)."""
+    if data[:4] != _MAGIC:
+        raise EncodingError("not an encoded GameState")
+    if data[4] not in (1, 2, VERSION):
+        raise EncodingError("can't decode version %i" % data[4])
+    reader = _Reader(data, data[4], allow_pickle)
+    reader.offset = 5
+    for _ in range(reader.uint("H")):
+        raw = reader.raw(reader.uint("B"))
+        reader.strings.append(raw.decode("utf-8"))
+    num_players, active, priority, phase, stack_len, super_len = [
+        reader.uint("B") for _ in range(6)]
+    state = GameState(num_players)
+    reader.state = state
+    state.active_player_index = active
+    state.priority_player_index = priority
+    state.phase = Times.Phase(phase)
+    for player in state.player_list:
+        if pilots is not None:
+            player.pilot = pilots[player.player_index]
+        player.turn_count = reader.uint("H")
+        player.life = reader.sint("h")
+        player.num_lands_played = reader.uint("B")
+        player.num_spells_cast = reader.uint("B")
+        player.victory_status = _VICTORY[reader.uint("B")]
+        player.pool = ManaPool()
+        player.pool.data = tuple([reader.uint("B") for _ in range(7)])
+        adders = [lambda card: player.add_to_deck(card, -1),
+                  player.add_to_hand, player.add_to_field, player.add_to_grave]
+        for adder in adders:
+            for _ in range(reader.uint("H")):
+                adder(reader.card())
+    for _ in range(stack_len):
+        reader.stack_object(on_stack=True)
+    for _ in range(super_len):
+        state.super_stack.append(reader.value())
+    return state
+
+
+class _Reader:
+    """Reads back the parts of an encoded GameState, in order."""
+
+    def __init__(self, data: bytes, version: int, allow_pickle: bool):
+        self.data = data
+        self.version = version
+        self.allow_pickle = allow_pickle
+        self.offset = 0
+        self.strings: List[str] = []
+        self.state: GameState | None = None
+
+    def byte(self) -> int:
+        self.offset += 1
+        return self.data[self.offset - 1]
+
+    def raw(self, length: int) -> bytes:
+        self.offset += length
+        return self.data[self.offset - length:self.offset]
+
+    def uint(self, old_format: str) -> int:
+        """A varint, or for versions before 3, a fixed-width int
+        in the given struct format."""
+        if self.version < 3:
+            [value] = struct.unpack_from("<" + old_format, self.data,
+                                         self.offset)
+            self.offset += struct.calcsize(old_format)
+            return value
+        value = 0
+        shift = 0
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if byte < 0x80:
+                return value
+
+    def sint(self, old_format: str) -> int:
+        if self.version < 3:
+            return self.uint(old_format)
+        value = self.uint("")
+        return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+    def string(self) -> str:
+        return self.strings[self.uint("H")]
+
+    def card(self) -> Cardboard:
+        card = Cardboard(_get_rules_text(self.uint("H")))
+        flags = self.byte()
+        card.tapped = bool(flags & 1)
+        card.summon_sick = bool(flags & 2)
+        card.owner_index = self.uint("B") - 1
+        card_counters = []
+        for _ in range(self.uint("B")):
+            text = self.string()
+            card_counters += [text] * self.uint("B")
+        card.counters = sorted(card_counters)
+        return card
+
+    def stack_object(self, on_stack: bool) -> StackObject:
+        name = self.string()
+        controller = self.uint("B")
+        if self.data[self.offset] == _NEW_CARD:
+            self.offset += 1
+            obj = self.card()
+        else:
+            obj = self.value()
+        cls = _get_class(name, StackObject)
+        stack_obj = cls(controller, obj, None, None)
+        if on_stack:
+            # add it first, since its own Verbs may point at its card
+            self.state.add_to_stack(stack_obj)
+        stack_obj.pay_cost = self.value()
+        stack_obj.do_effect = self.value()
+        return stack_obj
+
+    def value(self):
+        tag = self.byte()
+        if tag == _NONE:
+            return None
+        elif tag in (_FALSE, _TRUE):
+            return tag == _TRUE
+        elif tag == _INT:
+            return self.sint("i")
+        elif tag == _STR:
+            return self.string()
+        elif tag == _CARD:
+            zone_index = self.uint("B")
+            player = self.uint("B")
+            index = self.uint("H")
+            if zone_index == len(_ZONE_LISTS):  # on the stack
+                return self.state.stack[index].obj
+            pl = self.state.player_list[player]
+            name = _ZONE_LISTS[zone_index]
+            return (pl.deck_view if name == "deck"
+                    else getattr(pl, name))[index]
+        elif tag == _STACK_REF:
+            return self.state.stack[self.uint("B")]
+        elif tag == _STACK_OBJ:
+            return self.stack_object(on_stack=False)
+        elif tag == _VERB:
+            cls = _get_class(self.string(), Verbs.Verb)
+            # build it directly, like Verb.copy does, skipping its __init__
+            verb = cls.__new__(cls)
+            verb.num_inputs = self.uint("B")
+            flags = self.byte()
+            verb.copies = bool(flags & 1)
+            verb.is_populated = bool(flags & 2)
+            (verb._player, verb._source, verb._cause, verb._subject,
+             verb._inputs, verb._sub_verbs) = [self.value() for _ in range(6)]
+            return verb
+        elif tag == _ZONE:
+            cls = _get_class(self.string(), Zone.Zone)
+            zone = cls.__new__(cls)
+            zone.player = self.value()
+            zone.location = self.value()
+            return zone
+        elif tag == _SLICE:
+            return slice(*[self.value() for _ in range(3)])
+        elif tag in (_LIST, _TUPLE):
+            items = [self.value() for _ in range(self.uint("B"))]
+            return items if tag == _LIST else tuple(items)
+        elif tag == _ABILITY:
+            rules_id = self.uint("H")
+            list_index = self.uint("B")
+            index = self.uint("B")
+            return getattr(_get_rules_text(rules_id),
+                           _ABILITY_LISTS[list_index])[index]
+        elif tag == _PICKLED:
+            if not self.allow_pickle:
+                raise EncodingError("can't decode pickled data without "
+                                    "allow_pickle")
+            return pickle.loads(self.raw(self.uint("H")))
+        raise EncodingError("unknown value tag %i" % tag)
+
+
+def _get_class(name: str, base: type) -> type:
+    """The subclass of `base` (or `base` itself) with the given name."""
+    to_check = [base]
+    while len(to_check) > 0:
+        cls = to_check.pop()
+        if cls.__name__ == name:
+            return cls
+        to_check += cls.__subclasses__()
+    raise EncodingError("unknown %s %s" % (base.__name__, name))
@@ -14,6 +14,7 @@ import tkinter as tk
 
 
 class StackObject:
+    __slots__ = ("player_index", "obj", "pay_cost", "do_effect", "zone")
 
     def __init__(self, controller: int,
                  obj: (Cardboard | ActivatedAbility | TriggeredAbility
@@ -88,10 +89,13 @@ class StackObject:
             obj = self.obj.copy()
         cst = None if self.pay_cost is None else self.pay_cost.copy(state_new)
         ef = None if self.do_effect is None else self.do_effect.copy(state_new)
-        # initialize into a StackObject, then cast it to the correct subclass
-        new_obj = StackObject(controller, obj, cst, ef)
+        # build the sub-class directly, skipping its __init__
+        new_obj = self.__class__.__new__(self.__class__)
+        new_obj.player_index = controller
+        new_obj.obj = obj
+        new_obj.pay_cost = cst
+        new_obj.do_effect = ef
         new_obj.zone = self.zone.copy(None)
-        new_obj.__class__ = self.__class__  # set the class type directly
         return new_obj
 
     def build_tk_display(self, parentframe, ):
@@ -112,7 +116,7 @@ class StackObject:
 
 
 class StackAbility(StackObject):
-    pass
+    __slots__ = ()
 
 
 class StackTrigger(StackAbility):
@@ -125,10 +129,11 @@ class StackTrigger(StackAbility):
         copies, but putting things onto the superstack should
         mutate rather than copy.
     """
-    pass
+    __slots__ = ()
 
 
 class StackCardboard(StackObject):
+    __slots__ = ()
 
     def build_tk_display(self, parentframe, ):
         return tk.Button(parentframe,
@@ -15,13 +15,16 @@ from GameState import GameState
 import ManaHandler
 import Decklist
 from Cardboard import Cardboard
-from PlayTree import PlayTree
+from PlayTree import PlayTree, DominanceFilter
 import Verbs
 import Stack
 import Match2
 import time
+import tracemalloc
+import pickle
 import RulesText
 import Costs
+import Serialize
 from Times import Phase
 
 if __name__ == "__main__":
@@ -563,6 +566,30 @@ if __name__ == "__main__":
     assert activ_game.active.pool == ManaHandler.ManaPool("G")
     copygame = activ_game.copy()
     copygame.active.pool.add_mana("G")  # add mana directly
+    assert activ_game.active.pool == ManaHandler.ManaPool("G")  # not shared
+    # gold pays for missing colors. generic tries to leave one of each color
+    pool = ManaHandler.ManaPool("GA")
+    assert pool.can_afford_mana_cost(ManaHandler.ManaCost("GG"))
+    assert not pool.can_afford_mana_cost("GGG")
+    pool.pay_mana_cost("GG")
+    assert pool == ManaHandler.ManaPool("") and pool.cmc() == 0
+    pool.add_mana("WWUG")
+    pool.pay_mana_cost(ManaHandler.ManaCost("2"))
+    assert str(pool) == "UG"
+    assert len({ManaHandler.ManaPool("GU"), ManaHandler.ManaPool("UG")}) == 1
+    assert ManaHandler.ManaCost.parse("1G") is ManaHandler.ManaCost.parse("1G")
+    # each meaningfully different payment is its own option. leaving gold
+    # is always at least as good as leaving a color, so that one is dropped
+    assert ManaHandler.ManaPool("GGU").get_payments("2") == ["GG", "UG"]
+    assert ManaHandler.ManaPool("GGUA").get_payments("1G") == ["GG", "UG"]
+    assert ManaHandler.ManaPool("GA").get_payments("G") == ["G"]
+    assert ManaHandler.ManaPool("G").get_payments("1U") == []
+    copygame.active.pool.add_mana("U")
+    payers = Verbs.PayMana("2").populate_options(copygame, 0, roots, None)
+    assert [v.inputs[0] for v in payers] == ["GG", "UG"]
+    [(paid_game, paid, _)] = payers[1].do_it(copygame.copy())
+    assert str(paid_game.active.pool) == "G" and str(paid) == "PayMana{UG}"
+    copygame.active.pool.pay_mana_cost("U")
     # all 3 roots in hand only generate 1 option--to cast Roots
     assert (len(copygame.active.get_valid_castables()) == 1)
     assert (len(copygame.active.get_valid_castables(hide_equivalent=False))
@@ -1082,6 +1109,61 @@ if __name__ == "__main__":
     game2B.step_untap()
     assert (game1B == game2B)
 
+    # incremental hash should always match the hash built from scratch
+    for g in [game, cp, cp3, cp4, game1A, game1B, game2A, game2B]:
+        assert g.card_hash == g.recompute_card_hash()
+    assert hash(game1B) == hash(game2B)
+    assert hash(cp3) == hash(cp4)
+
+    # copies share the deck until one of them looks at it
+    game = GameState(1)
+    for _ in range(5):
+        game.give_to(Cardboard(Decklist.Forest()), Zone.DeckTop)
+    cp = game.copy()
+    assert cp.active._deck is game.active._deck
+    assert cp == game
+    # reading the deck doesn't break the sharing
+    assert len(Zone.Deck(0).peek(cp)) == 5
+    forests = Get.Count(Match2.Name("Forest"), Zone.Deck(0))
+    assert forests.get(cp, 0, None) == 5
+    assert cp.active._deck is game.active._deck
+    Verbs.DrawCard().replace_subject(0).do_it(cp)
+    assert cp.active._deck is not game.active._deck
+    assert len(cp.active.deck) == 4 and len(cp.active.hand) == 1
+    assert len(game.active.deck) == 5 and len(game.active.hand) == 0
+    assert all([c.zone.location == ii
+                for ii, c in enumerate(game.active.deck)])
+    assert cp != game
+
+    # checkpoint, mutate, and rewind should give back the same state
+    game.give_to(Cardboard(Decklist.Forest()), Zone.Field)
+    before = game.copy()
+    record = game.checkpoint()
+    forest = game.active.field[0]
+    caster = forest.get_activated()[0].valid_caster(game, 0, forest)
+    game.in_place_mode = True
+    [(tapped, _, _)] = caster.do_it(game)
+    Verbs.DrawCard().replace_subject(0).do_it(game)
+    assert tapped is game and game != before
+    assert game.active.field[0].tapped and str(game.active.pool) == "G"
+    game.rewind(record)
+    assert game == before and not forest.tapped
+    assert len(game.active.deck) == 5 and len(game.active.hand) == 0
+    assert game.card_hash == game.recompute_card_hash()
+    game.in_place_mode = False
+    # abandoning the in-place actions part-way still rewinds the state
+    game.phase = Phase.MAIN1
+    before = game.copy()
+    actions = game.do_priority_action_in_place()
+    next(actions)
+    assert game.in_place_mode
+    actions.close()
+    assert game == before and not game.in_place_mode
+    # and the frozen key doesn't change when the state does
+    key = game.get_key()
+    game.active.life = 12
+    assert key != game and key == before and hash(key) == hash(before)
+
     print("      ...done, %0.2f sec" % (time.perf_counter() - start_clock))
 
     # -----------------------------------------------------------------------
@@ -1101,7 +1183,7 @@ if __name__ == "__main__":
     game.give_to(caryatid, Zone.Field)
     # no, caretaker is still summon_sick. good.
     assert len(game.active.get_valid_activations()) == 0
-    game.active.field.remove(caryatid)
+    game.active.remove_from_field(caryatid)
 
     game.pass_turn()
     game.step_untap()
@@ -1198,6 +1280,11 @@ if __name__ == "__main__":
     # axebane; battlement; caryatid; caretaker x 2
     assert len(game6.active.get_valid_activations(hide_equivalent=False)) == 5
     assert len(game6.active.get_valid_activations()) == 4
+    # most mana: Axebane and Battlement make 5 each, Caryatid 1, and one
+    # Caretaker taps the other. Tapping Caryatid instead would gain nothing
+    potential = game6.active.get_mana_potential()
+    assert potential.total == 12
+    assert str(potential) == "Potential(12: W7,U7,B7,R7,G12,C7,A7)"
 
     game6.active.turn_count = 1  # set to turn 1, not turn 0
     game6.phase = Phase.MAIN1  # set to main phase
@@ -1219,6 +1306,143 @@ if __name__ == "__main__":
                 assert all([("Activate %s" % target_tapped) not in h
                             for h in hist_list[ii + 1:]])
 
+    # abilities which only tap their own source commute with each other, so
+    # they are only tried in sorted order. Caretaker taps others, so it
+    # doesn't commute with anything.
+    casters = {c.source.name: c for c in game6.active.get_valid_activations()}
+    assert casters["Caretaker"].get_commute_key(game6) is None
+    assert (casters["Axebane"].get_commute_key(game6)
+            < casters["Caryatid"].get_commute_key(game6))
+    [after_caryatid] = game6.do_action(casters["Caryatid"])
+    names = [v.source.name for v in after_caryatid.get_priority_actions()
+             if isinstance(v, Verbs.PlayAbility)]
+    assert names == ["Caretaker"]
+    [after_axebane] = game6.do_action(casters["Axebane"])
+    names = [v.source.name for v in after_axebane.get_priority_actions()
+             if isinstance(v, Verbs.PlayAbility)]
+    assert set(names) == {"Battlement", "Caryatid", "Caretaker"}
+
+    # valid actions are cached by hash, but rebuilt for each GameState
+    first = game6.active.get_valid_activations()
+    copy6 = game6.copy()
+    assert copy6.action_cache is game6.action_cache
+    hits = copy6.action_cache.hits
+    second = copy6.active.get_valid_activations()
+    assert copy6.action_cache.hits == hits + 1
+    assert [str(c) for c in first] == [str(c) for c in second]
+    assert all([c.source in copy6.active.field for c in second])
+    assert not any([c.source in copy6.active.field for c in first])
+    # an entry for a different GameState with the same hash isn't used
+    copy6.action_cache.put((hash(copy6), 0), ([], []), "some other state")
+    assert ([str(c) for c in copy6.active.get_valid_activations()]
+            == [str(c) for c in first])
+    assert GameState(1).action_cache is not game6.action_cache
+    # after tapping Battlement, only cards which care get checked again:
+    # Battlement itself, and Caretaker (which looks at other creatures)
+    game6.action_cache.clear()
+    game6.caster_cache.clear()
+    game6.active.get_valid_activations()
+    [after_battlement] = game6.do_action(casters["Battlement"])
+    misses = after_battlement.caster_cache.misses
+    after_battlement.active.get_valid_activations()
+    assert after_battlement.caster_cache.misses == misses + 2
+    # the caster cache knows apart RulesTexts which share a class name
+
+    class Twin(Decklist.Caretaker):
+        pass
+    green_twin = Twin
+
+    class Twin(Decklist.Caretaker):
+        def __init__(self):
+            super().__init__()
+            self.cost = Costs.Cost("U")
+    green = GameState(1)
+    green.active.pool.add_mana("G")
+    green.give_to(Cardboard(green_twin()), Zone.Hand)
+    blue = green.copy()
+    blue.active.remove_from_hand(blue.active.hand[0])
+    blue.give_to(Cardboard(Twin()), Zone.Hand)
+    assert len(green.active.get_valid_castables()) == 1
+    green.action_cache.clear()  # the GameStates have the same ID
+    assert blue.caster_cache is green.caster_cache
+    assert len(blue.active.get_valid_castables()) == 0
+    # equivalent cards are grouped, so each kind only gets checked once
+    game7 = GameState(1)
+    for _ in range(3):
+        game7.give_to(Cardboard(Decklist.Caretaker()), Zone.Field)
+    game7.give_to(Cardboard(Decklist.Battlement()), Zone.Field)
+    groups = game7.active.get_groups("field")
+    assert sorted([len(g) for g in groups.values()]) == [1, 3]
+    assert game7.active.get_groups("field") is groups  # cached
+    game7.give_to(Cardboard(Decklist.Caretaker()), Zone.Field)
+    assert len(Zone.Field(0).get_groups(game7)) == 2
+    assert sorted([len(g) for g in Zone.Field(0).get_groups(game7)]) == [1, 4]
+    # groups are keyed by the full ID, so even cards whose hashed_values
+    # collide are kept apart
+    [battlement] = [c for c in game7.active.field if c.name == "Battlement"]
+    real_value = battlement.hashed_value
+    battlement.hashed_value = game7.active.field[-1].hashed_value
+    game7.active._groups = {}
+    assert sorted([len(g) for g in Zone.Field(0).get_groups(game7)]) == [1, 4]
+    battlement.hashed_value = real_value
+    # taking a card out and putting an equivalent one in leaves card_hash
+    # the same, but the groups have to hold the new card
+    game9 = GameState(1)
+    game9.active.pool.add_mana("GG")
+    game9.give_to(Cardboard(Decklist.Caretaker()), Zone.Hand)
+    assert len(game9.active.get_valid_castables()) == 1
+    game9.active.remove_from_hand(game9.active.hand[0])
+    game9.give_to(Cardboard(Decklist.Caretaker()), Zone.Hand)
+    game9.action_cache.clear()
+    game9.caster_cache.clear()
+    assert len(game9.active.get_valid_castables()) == 1
+    # cards outside of the card_hash are regrouped whenever they're asked for
+    game8 = GameState(1)
+    for _ in range(2):
+        game8.active.hand.append(Cardboard(Decklist.Caretaker()))
+    assert len(game8.active.get_groups("hand")) == 1
+    game8.active.hand[0].counters.append("@")
+    assert len(game8.active.get_groups("hand")) == 2
+    caretaker = game7.active.field[-1]
+    assert Get.Count(Match2.Keyword("defender"), Zone.Field(0)
+                     ).get(game7, 0, caretaker) == 5
+    assert Get.Count(Match2.Another(), Zone.Field(0)
+                     ).get(game7, 0, caretaker) == 4
+    assert Get.Count(Match2.IsSelf(), Zone.Field(None)
+                     ).get(game7, 0, caretaker) == 1
+    # simple patterns are counted from the totals each Player keeps
+    defenders = Get.Count(Match2.Keyword("defender"), Zone.Field(0))
+    assert game7.active.aggregates["field"][(Get.Keywords, "defender")] == 5
+    record = game7.checkpoint()
+    game7.active.remove_from_field(caretaker)
+    assert defenders.get(game7, 0, None) == 4
+    assert Get.Count(Match2.Name("Caretaker"), Zone.Field(None)
+                     ).get(game7, 0, None) == 3
+    game7.rewind(record)
+    assert defenders.get(game7, 0, None) == 5
+    assert game7.copy().active.aggregates == game7.active.aggregates
+    # compiled patterns give the same answers as matching one at a time
+    game7.active.field[1].tapped = True  # a Caretaker
+    pattern = ((Match2.Untapped() & Match2.Another()
+                & Match2.CardType("creature"))
+               | (Match2.Name("Battlement") & Match2.Keyword("defender")))
+    pred = pattern.compile()
+    assert pattern.compile() is pred  # cached
+    plain = Match2.get_plain_getters(game7)
+    assert Get.Keywords in plain and Get.IsTapped in plain
+    for c in game7.active.field:
+        assert (pred(c, game7, 0, caretaker, plain)
+                == pred(c, game7, 0, caretaker, None)
+                == pattern.match(c, game7, 0, caretaker))
+    matches = pattern.filter(game7.active.field, game7, 0, caretaker)
+    assert matches == [c for c in game7.active.field
+                       if pattern.match(c, game7, 0, caretaker)]
+    assert len(matches) == 3  # Battlement and two untapped Caretakers
+    assert not any([c is caretaker for c in matches])
+    assert not Match2.Tapped().match(caretaker, game7, 0,
+                                     game7.active.field[1])
+    game7.active.field[1].tapped = False
+
     print("      ...done, %0.2f sec" % (time.perf_counter() - start_clock))
 
     # -----------------------------------------------------------------------
@@ -1275,6 +1499,101 @@ if __name__ == "__main__":
     print("             (~1.20 2022-09-06)")
     print("             (~0.70 2022-07-22)")
 
+    # skip mana abilities when no amount of mana could cast anything new
+    game3 = game.copy()
+    game3.active.pilot = Pilots.BotTriesAll()
+    game3.active.pilot.skip_useless_mana = True
+    start_clock = time.perf_counter()
+    tree3 = PlayTree([game3], 5)
+    for turn in [1, 2, 3]:
+        if turn > 1:
+            tree3.beginning_phases()
+        tree3.main_phase_then_end()
+    assert tree3.get_num_active(3) == [33, 16, 16, 403, 0, 0, 403]
+    cast_eight = [g for g in tree3.get_latest_active(3, Phase.CLEANUP)
+                  if "EightDrop" in [c.name for c in g.active.field]]
+    assert len(cast_eight) == 1
+    # ...and that board could have been spotted without any searching
+    board = GameState(1)
+    for card in [Decklist.Forest(), Decklist.Forest(), Decklist.Forest(),
+                 Decklist.Roots(), Decklist.Caretaker(),
+                 Decklist.Battlement()]:
+        board.give_to(Cardboard(card), Zone.Field)
+    board.pass_turn()
+    board.step_untap()
+    board.phase = Phase.MAIN1
+    potential = board.active.get_mana_potential()
+    assert potential.total == 8 and potential.most[4] == 8  # 8 green
+    assert potential.could_pay(board.active.pool, "8")
+    assert not potential.could_pay(board.active.pool, "9")
+    assert not potential.could_pay(board.active.pool, "WW")
+    board.give_to(Cardboard(EightDrop()), Zone.Hand)
+    assert board.active.could_use_more_mana()
+    # takes every mana source, with Caretaker tapping Roots (not Battlement)
+    [plan] = board.active.get_auto_tap_plans(board.active.hand[0])
+    assert len(plan.sub_verbs) == 7 and plan.inputs[0].name == "Roots"
+    [(board2, _, _)] = plan.do_it(board)
+    assert [c.name for c in board2.stack] == ["EightDrop"]
+    assert str(board2.active.pool) == "" and str(board.active.pool) == ""
+    board.active.remove_from_hand(board.active.hand[0])
+    assert not board.active.could_use_more_mana()
+
+    print("      skip useless mana: %4.2f sec." % (time.perf_counter()
+                                                  - start_clock))
+
+    # auto-tapping: mana abilities only as part of casting, in minimal sets
+    game4 = game.copy()
+    game4.active.pilot = Pilots.BotTriesAll()
+    game4.active.pilot.auto_tap = True
+    start_clock = time.perf_counter()
+    tree4 = PlayTree([game4], 5)
+    for turn in [1, 2, 3]:
+        if turn > 1:
+            tree4.beginning_phases()
+        tree4.main_phase_then_end()
+    assert tree4.get_num_active(3) == [20, 15, 15, 140, 0, 0, 140]
+    cast_eight = [g for g in tree4.get_latest_active(3, Phase.CLEANUP)
+                  if "EightDrop" in [c.name for c in g.active.field]]
+    assert len(cast_eight) == 1
+
+    # mana abilities still get offered alone if auto-tap can't plan with
+    # them, or if another ability needs mana
+
+    class Filter(RulesText.Land):
+        def __init__(self):
+            super().__init__()
+            self.name = "Filter"
+            self.add_activated("Filter add U", Costs.Cost("G"),
+                               Verbs.AddMana("U"))
+
+    class Pumper(RulesText.Creature):
+        def __init__(self):
+            super().__init__()
+            self.name = "Pumper"
+            self.cost = Costs.Cost("G")
+            self.set_power_toughness(1, 1)
+            self.add_activated("Pumper grow", Costs.Cost("G"),
+                               Verbs.AddCounter("+1/+1"))
+
+    def option_types(g): return [type(v) for v in g.get_priority_actions()]
+    tapper = GameState(1)
+    tapper.active.pilot = Pilots.BotTriesAll()
+    tapper.active.pilot.auto_tap = True
+    tapper.active.turn_count = 1
+    tapper.phase = Phase.MAIN1
+    tapper.give_to(Cardboard(Decklist.Forest()), Zone.Field)
+    tapper.give_to(Cardboard(Decklist.Caretaker()), Zone.Hand)
+    assert option_types(tapper) == [Verbs.AutoTapCast, Verbs.NullVerb]
+    filtered = tapper.copy()
+    filtered.give_to(Cardboard(Filter()), Zone.Field)
+    assert option_types(filtered) == [Verbs.PlayManaAbility, Verbs.NullVerb]
+    pumped = tapper.copy()
+    pumped.give_to(Cardboard(Pumper()), Zone.Field)
+    assert Verbs.PlayManaAbility in option_types(pumped)
+    assert Verbs.AutoTapCast in option_types(pumped)
+
+    print("      auto-tap: %4.2f sec." % (time.perf_counter() - start_clock))
+
     # try a speed-test using a smarter pilot
 
     game2 = game.copy()
@@ -1295,8 +1614,124 @@ if __name__ == "__main__":
                   if "EightDrop" in [c.name for c in g.active.field]]
     assert len(cast_eight) == 1
 
+    stats = tree2.get_stats()
+    assert stats["table_hits"] > 0 and stats["table_evictions"] == 0
+    assert 0 < stats["table_hit_rate"] < 1
+    assert stats["num_active"] > sum(tree2.get_num_active(3))
+
     print("      smarter: %4.2f sec." % (time.perf_counter() - start_clock))
 
+    # same results when spread across several worker processes
+    # (not tracking history, since that makes sending states slow)
+    game2p = game2.copy()
+    game2p.is_tracking_history = False
+    tree2p = PlayTree([game2p], 5, num_workers=2)
+    for _ in range(3):
+        tree2p.main_phase_then_end()
+        tree2p.beginning_phases()
+    tree2p.close()
+    assert tree2p.get_num_active(3) == [2, 2, 2, 4, 0, 0, 4]
+    assert (set(tree2p.get_latest_active(3, Phase.CLEANUP))
+            == set(tree2.get_latest_active(3, Phase.CLEANUP)))
+
+    # tiny transposition table still works, it just repeats work sometimes
+    tree2b = PlayTree([game2.copy()], 5, table_size=20, eviction="depth")
+    for _ in range(3):
+        tree2b.main_phase_then_end()
+        tree2b.beginning_phases()
+    assert tree2b.get_stats()["table_evictions"] > 0
+    assert len(tree2b.table) == 20
+    assert tree2b.get_num_active(3) == [2, 2, 2, 4, 0, 0, 4]
+    cast_eight = [g for g in tree2b.get_latest_active(3, Phase.CLEANUP)
+                  if "EightDrop" in [c.name for c in g.active.field]]
+    assert len(cast_eight) >= 1
+
+    # same tree again, but mutating and rewinding states instead of copying
+    start_clock = time.perf_counter()
+    tree3 = PlayTree([game.copy()], 5, in_place=True)
+    tree3.main_phase_then_end()
+    assert tree3.get_num_active(1) == [0, 0, 1, 4, 0, 0, 4]
+    tree3.beginning_phases()
+    tree3.main_phase_then_end()
+    assert tree3.get_num_active(2) == [4, 3, 3, 31, 0, 0, 31]
+    tree3.beginning_phases()
+    tree3.main_phase_then_end()
+    assert tree3.get_num_active(3) == [35, 16, 16, 629, 0, 0, 629]
+    assert (set(tree3.get_latest_active(3, Phase.CLEANUP))
+            == set(tree.get_latest_active(3, Phase.CLEANUP)))
+    cast_eight = [g for g in tree3.get_latest_active(3, Phase.CLEANUP)
+                  if "EightDrop" in [c.name for c in g.active.field]]
+    assert len(cast_eight) == 1
+    assert "*** Cast EightDrop ***" in cast_eight[0].get_all_history()
+
+    print("      in-place: %4.2f sec." % (time.perf_counter() - start_clock))
+
+    # just look for one way to cast the EightDrop, and stop once found
+    start_clock = time.perf_counter()
+    def has_eight(g): return "EightDrop" in [c.name for c in g.active.field]
+    path = PlayTree([game.copy()], 5).search(has_eight, turn_limit=3)
+    assert path is not None
+    assert path[0][0] == "start" and path[0][1] == game
+    assert "Cast EightDrop" in [text for text, _ in path]
+    assert has_eight(path[-1][1])
+    assert path[-1][1].total_turns == 3
+    print("      search: %4.2f sec." % (time.perf_counter() - start_clock))
+    assert PlayTree([game.copy()], 5).search(has_eight, turn_limit=2) is None
+
+    # beam search, keeping only the states with the most permanents & mana
+    start_clock = time.perf_counter()
+    def score(g): return len(g.active.field) + g.active.pool.cmc()
+    tree4 = PlayTree([game.copy()], 5, heuristic=score, beam_width=5,
+                     max_frontier=50)
+    for _ in range(3):
+        tree4.main_phase_then_end()
+        tree4.beginning_phases()
+    assert tree4.get_num_active(3) == [5, 3, 3, 5, 0, 0, 5]  # empirical
+    assert tree4.get_stats()["num_pruned"] > 0
+    cast_eight = [g for g in tree4.get_latest_active(3, Phase.CLEANUP)
+                  if "EightDrop" in [c.name for c in g.active.field]]
+    assert len(cast_eight) == 1
+    try:
+        PlayTree([game.copy()], 5, in_place=True, heuristic=score)
+        assert False  # should have raised an error
+    except ValueError:
+        pass
+    print("      beam: %4.2f sec." % (time.perf_counter() - start_clock))
+
+    # throw away states which are just worse versions of another state
+    start_clock = time.perf_counter()
+    tree5 = PlayTree([game.copy()], 5, dominance=["mana", "untapped"])
+    for _ in range(3):
+        tree5.main_phase_then_end()
+        tree5.beginning_phases()
+    assert tree5.get_num_active(2) == [3, 3, 3, 18, 0, 0, 18]  # empirical
+    assert tree5.get_num_active(3) == [22, 16, 16, 180, 0, 0, 180]
+    assert tree5.get_stats()["num_dominated"] > 0
+    cast_eight = [g for g in tree5.get_latest_active(3, Phase.CLEANUP)
+                  if "EightDrop" in [c.name for c in g.active.field]]
+    assert len(cast_eight) == 1
+    # every state kept by the filter is also in the full tree
+    assert (set(tree5.get_latest_active(3, Phase.CLEANUP))
+            <= set(tree.get_latest_active(3, Phase.CLEANUP)))
+    # a bigger hand only dominates if it holds every card of the smaller
+    small = GameState(1)
+    small.give_to(Cardboard(Decklist.Caretaker()), Zone.Hand)
+    big = GameState(1)
+    for _ in range(2):
+        big.give_to(Cardboard(Decklist.Forest()), Zone.Hand)
+    both = big.copy()
+    both.give_to(Cardboard(Decklist.Caretaker()), Zone.Hand)
+    assert "hand" not in DominanceFilter().features  # only if asked for
+    dominance = DominanceFilter(["hand"])
+    assert dominance.filter([small]) == [small]
+    assert dominance.filter([big]) == [big]
+    assert len(dominance) == 2
+    # later states evict the states they dominate from the filter
+    assert dominance.filter([both]) == [both]
+    assert len(dominance) == 1
+    assert dominance.is_dominated(small) and dominance.is_dominated(big)
+    print("      dominance: %4.2f sec." % (time.perf_counter() - start_clock))
+
     # -----------------------------------------------------------------------
 
     print("Testing Wall of Blossoms, Arcades, and ETBs")
@@ -1367,20 +1802,21 @@ if __name__ == "__main__":
     gameA.give_to(Cardboard(Decklist.Blossoms()), Zone.Field)
     assert len(gameA.super_stack) == 2
     assert len(gameA.stack) == 0
+    # both triggers listen for cards moving. tapping can't trigger either.
+    assert len(gameA.get_trigger_holders(Verbs.MoveToZone(Zone.Hand(0)))) == 2
+    assert gameA.get_trigger_holders(Verbs.Tap()) == []
+    assert len(gameA.get_trigger_holders(
+        Verbs.Tap() + Verbs.MoveToZone(Zone.Grave(0)))) == 2
     assert len(gameA.active.hand) == 0  # haven't draw, put triggers on stack
     assert len(gameA.active.deck) == 10  # haven't draw, put triggers on stack
-    # clear the super_stack and then stack. should come to the same thing.
-    gameA, gameA1 = gameA.clear_super_stack()
-    assert gameA != gameA1  # different order of triggers
+    # clear the super_stack and then stack. both triggers just draw a card,
+    # so either order comes to the same thing. only one order is tried.
+    [gameA] = gameA.clear_super_stack()
+    assert len(gameA.stack) == 2
     while len(gameA.stack) > 0:
         universes = gameA.resolve_top_of_stack()
         assert len(universes) == 1
         gameA = universes[0]
-    while len(gameA1.stack) > 0:
-        universes = gameA1.resolve_top_of_stack()
-        assert len(universes) == 1
-        gameA1 = universes[0]
-    assert gameA == gameA1
     assert len(gameA.super_stack) == 0
     # should have drawn 2 cards
     assert len(gameA.active.hand) == 2
@@ -1430,9 +1866,10 @@ if __name__ == "__main__":
     game.give_to(Cardboard(Decklist.Forest()), Zone.DeckTop, 0)
     # cast Collected Company
     universes = cast_and_resolve_company(game)
-    assert len(universes) == 11
-    # (axe, caretaker)x2. (battle, caretaker)x2. (axe, battle).
-    # (double caretaker). (axe). (battle). (caretaker)x2. (none). that's 11!
+    assert len(universes) == 8
+    # (axe, caretaker). (battle, caretaker). (axe, battle).
+    # (double caretaker). (axe). (battle). (caretaker). (none). that's 8!
+    # the two caretakers are equivalent, so no duplicate universes
     assert len(set(universes)) == 8
     num_in_field = [0, 0, 0]
     for u in universes:
@@ -1446,7 +1883,7 @@ if __name__ == "__main__":
             assert (not any(
                 [c.name == "Battlement" for c in u.active.deck]))
         assert (not any(["land" in c.cardtypes for c in u.active.field]))
-    assert num_in_field == [1, 4, 6]
+    assert num_in_field == [1, 3, 4]
 
     # deck of 5 forests on top, one Caretaker, then 10 islands
     game1 = GameState()
@@ -1474,12 +1911,20 @@ if __name__ == "__main__":
     assert (len(game4.active.deck) == 4)
     # cast Collected Company
     universes = cast_and_resolve_company(game4)
-    # Choices DOES avoid returning AB and BA. But it returns A+B1 and A+B2
-    # even if B1 and B2 are equivalent cards. So (4*3)/2 + 4 + 1
-    assert len(universes) == 11
+    # Choices avoids returning AB and BA, and also A+B1 and A+B2 when B1 and
+    # B2 are equivalent cards. So just choose two, one, or none.
+    assert len(universes) == 3
     for u in universes:
         assert len(u.active.deck) + len(u.active.field) == 4
         assert len(u.active.grave) == 1
+    axe = Cardboard(Decklist.Axebane())
+    care1 = Cardboard(Decklist.Caretaker())
+    care2 = Cardboard(Decklist.Caretaker())
+    assert (Pilots.distinct_combinations([axe, care1, care2], 2)
+            == [(axe, care1), (care1, care2)])
+    assert (Pilots.distinct_combinations([care1, axe, care2], 1)
+            == [(care1,), (axe,)])
+    assert Pilots.BotTriesAll().choose_exactly_one([care1, care2]) == [care1]
 
     # Does Blossoms trigger correctly? start with 12 cards in deck
     game = GameState()
@@ -1490,22 +1935,18 @@ if __name__ == "__main__":
     assert len(game.active.deck) == 12
     # cast Collected Company
     universes = cast_and_resolve_company(game)
-    # (omens, blossons) triggers; reverse order; just one or other; neither.
-    assert len(universes) == 5
+    # (omens, blossons) triggers; just one or other; neither. both triggers
+    # just draw a card, so the reverse order isn't tried.
+    assert len(universes) == 4
     lengths = [(len(u.active.field), len(u.active.deck)) for u in universes]
-    assert lengths == [(2, 10), (2, 10), (1, 11), (1, 11), (0, 12)]
-    u0, u1 = [u for u in universes if len(u.active.field) == 2]
-    assert u0 != u1
+    assert lengths == [(2, 10), (1, 11), (1, 11), (0, 12)]
+    [u0] = [u for u in universes if len(u.active.field) == 2]
     while len(u0.stack) > 0:
         [u0] = u0.resolve_top_of_stack()
-    while len(u1.stack) > 0:
-        [u1] = u1.resolve_top_of_stack()
-    assert u0 == u1
     assert len(u0.active.hand) == 2 and len(u0.active.deck) == 8
 
-    # Note: if I put two identical Blossoms into play simultaneously, I STILL
-    # will get two GameStates even though they are identical! And that's ok.
-    # it's not worth the effort to optimize this out, right now.
+    # if I put two identical Blossoms into play simultaneously, their
+    # triggers are interchangeable, so only one order is tried.
     game = GameState()
     game.give_to(Cardboard(Decklist.Blossoms()), Zone.DeckTop, 0)
     game.give_to(Cardboard(Decklist.Blossoms()), Zone.DeckTop, 0)
@@ -1513,12 +1954,12 @@ if __name__ == "__main__":
         game.give_to(Cardboard(Decklist.Forest()), Zone.DeckBottom, 0)
     # cast Collected Company
     universes = cast_and_resolve_company(game)
-    # (blossons, blossons) triggers; reverse order; just one or other; neither.
-    assert len(universes) == 5
+    # (blossons, blossons) triggers; just one; neither.
+    # choosing either of the equivalent Blossoms is the same choice.
+    assert len(universes) == 3
     lengths = [(len(u.active.field), len(u.active.deck)) for u in universes]
-    assert lengths == [(2, 10), (2, 10), (1, 11), (1, 11), (0, 12)]
-    u0, u1 = [u for u in universes if len(u.active.field) == 2]
-    assert u0 == u1
+    assert lengths == [(2, 10), (1, 11), (0, 12)]
+    u0 = universes[0]
     while len(u0.stack) > 0:
         [u0] = u0.resolve_top_of_stack()
     assert len(u0.active.hand) == 2 and len(u0.active.deck) == 8
@@ -1640,6 +2081,12 @@ if __name__ == "__main__":
     assert len(pop_game.active.get_valid_activations()) == 1
     assert all(["haste" in Get.Keywords().get(pop_game, 0, c)
                 for c in field0 + field1])
+    # no printed haste, but Count sees the static and checks each card
+    assert Get.Count(Match2.Keyword("haste"), Zone.Field(None)
+                     ).get(pop_game, 0, None) == len(field0 + field1)
+    assert Get.Keywords not in Match2.get_plain_getters(pop_game)
+    assert Match2.Keyword("haste").filter(field0 + field1, pop_game, 0,
+                                          None) == field0 + field1
     # pull the Giver of Haste
     Verbs.MoveToZone.move(pop_game, field0[2], Zone.Hand(0), True)
     assert len(pop_game.statics_to_remove) == 1  # static ready to be removed,
@@ -1721,6 +2168,38 @@ if __name__ == "__main__":
     assert deadgame.player_list[1].field[0].name == "CantKillMe"
     assert len(deadgame.player_list[1].field[0].counters) == 1
     assert Get.Power().get(deadgame, 0, deadgame.player_list[1].field[0]) == 1
+    # statics are indexed by what they listen for, so most Verbs and Getters
+    # don't even look at them
+    assert len(pop_game.get_static_holders(Verbs.Destroy())) == 1
+    assert pop_game.get_static_holders(Verbs.Tap()) == []
+    assert len(pop_game.get_static_holders(Get.PowerAndTough())) > 0
+    assert pop_game.get_static_holders(Get.Count(Match2.Anything(),
+                                                 Zone.Field(0))) == []
+    # Getter results are memoized until the GameState next changes
+    vanilla = field0[-1]
+    assert not Get.IsTapped().get(pop_game, 0, vanilla)
+    cache = pop_game.get_getter_cache()
+    assert (Get.IsTapped, 0, id(vanilla)) in cache
+    assert Get.Power().get(pop_game, 0, vanilla) == 3
+    assert pop_game.get_getter_cache() is cache
+    [tapper] = Verbs.Tap().populate_options(pop_game, 0, vanilla, None)
+    tapper.replace_subject(vanilla).do_it(pop_game)
+    assert pop_game.get_getter_cache() is not cache
+    assert Get.IsTapped().get(pop_game, 0, vanilla)
+    # lists from the cache are copies, so callers can't change the cache
+    keywords = Get.Keywords().get(pop_game, 0, vanilla)
+    keywords.append("flying")
+    assert "flying" not in Get.Keywords().get(pop_game, 0, vanilla)
+    assert "flying" not in vanilla.rules_text.keywords
+
+    # a Getter without a __dict__ (as with __slots__) is still cached
+
+    class NoDictTapped(Get.IsTapped):
+        @property
+        def __dict__(self):
+            raise TypeError("no __dict__")
+    assert NoDictTapped().get(pop_game, 0, vanilla)
+    assert (NoDictTapped, 0, id(vanilla)) in pop_game.get_getter_cache()
 
 
 
@@ -1750,4 +2229,152 @@ if __name__ == "__main__":
 
     print("      ...done, %0.2f sec" % (time.perf_counter() - start_clock))
 
+    # -----------------------------------------------------------------------
+
+    print("Testing binary encoding of GameStates...")
+    start_clock = time.perf_counter()
+
+    game = GameState(2)
+    for x in range(5):
+        game.give_to(Cardboard(Decklist.Island()), Zone.DeckTop)
+    game.give_to(Cardboard(Decklist.Forest()), Zone.DeckBottom)
+    game.give_to(Cardboard(Decklist.Roots()), Zone.Field)
+    game.give_to(Cardboard(Decklist.Arcades()), Zone.Field)
+    game.give_to(Cardboard(Decklist.Company()), Zone.Hand, 1)
+    game.give_to(Cardboard(Decklist.Caryatid()), Zone.Grave, 1)
+    roots = game.active.field[1]
+    [caster] = roots.get_activated()[0].valid_caster(game, 0,
+                                                     roots).do_it(game)
+    game = caster[0]
+    game.player_list[1].life = 13
+    game.phase = Phase.MAIN2
+    data = Serialize.encode(game)
+    assert len(data) < 150
+    game2 = Serialize.decode(data)
+    assert game2 == game and hash(game2) == hash(game)
+    assert str(game2.active.pool) == "G"
+    assert game2.active.field[1].counters == game.active.field[1].counters
+    assert [c.name for c in game2.active.deck] == ["Forest"] + ["Island"] * 5
+    # trigger from Arcades was rebuilt, so Blossoms still gets to draw
+    assert len(game2.trig_event) == len(game.trig_event) == 1
+    game2.give_to(Cardboard(Decklist.Blossoms()), Zone.Field)
+    assert len(game2.super_stack) == 2
+    # encoding a copy doesn't make it copy its shared deck
+    cp = game.copy()
+    assert Serialize.decode(Serialize.encode(cp)) == game
+    assert cp.active._deck is game.active._deck
+    # triggers waiting on the super_stack, then on the stack
+    game.give_to(Cardboard(Decklist.Blossoms()), Zone.Field)
+    game2 = Serialize.decode(Serialize.encode(game))
+    assert game2 == game and len(game2.super_stack) == 2
+    [game] = game.clear_super_stack()
+    game2 = Serialize.decode(Serialize.encode(game))
+    assert game2 == game and len(game2.stack) == 2
+    assert set(game2.resolve_top_of_stack()) == set(
+        game.resolve_top_of_stack())
+    # a spell on the stack, whose effect still has choices to make
+    game = GameState(1)
+    game.active.pool.add_mana("GGGG")
+    game.give_to(Cardboard(Decklist.Company()), Zone.Hand)
+    for card in [Decklist.Caretaker(), Decklist.Axebane(), Decklist.Forest()]:
+        game.give_to(Cardboard(card), Zone.DeckTop)
+    [(game, _, _)] = game.active.get_valid_castables()[0].do_it(game)
+    # its Getters can only be pickled, which has to be asked for
+    try:
+        Serialize.encode(game)
+        assert False  # should have raised an error
+    except Serialize.EncodingError:
+        pass
+    data = Serialize.encode(game, allow_pickle=True)
+    try:
+        Serialize.decode(data)
+        assert False  # should have raised an error
+    except Serialize.EncodingError:
+        pass
+    game2 = Serialize.decode(data, allow_pickle=True)
+    assert game2 == game and game2.stack[0].obj.zone == Zone.Stack(0)
+    universes = game.resolve_top_of_stack()
+    assert len(universes) == 4
+    assert set(game2.resolve_top_of_stack()) == set(universes)
+    # a spell cast while searching, whose payment holds its own copy of
+    # the card on the stack
+    game = GameState(1)
+    game.active.turn_count = 1
+    game.phase = Phase.MAIN1
+    game.give_to(Cardboard(Decklist.Forest()), Zone.Hand)
+    game.give_to(Cardboard(Decklist.Caretaker()), Zone.Hand)
+    path = PlayTree([game], 2).search(lambda g: len(g.stack) > 0)
+    game = path[-1][1]
+    game2 = Serialize.decode(Serialize.encode(game))
+    assert game2 == game and hash(game2) == hash(game)
+    assert set(game2.resolve_top_of_stack()) == set(
+        game.resolve_top_of_stack())
+    # big numbers don't overflow any fields
+    game = GameState(1)
+    game.active.life = -40000
+    game.active.num_spells_cast = 300
+    game.active.pool.add_mana("G" * 300)
+    game.give_to(Cardboard(Decklist.Roots()), Zone.Field)
+    game.active.field[0].counters = ["-0/-1"] * 300
+    game.rehash_card(game.active.field[0])
+    game2 = Serialize.decode(Serialize.encode(game))
+    assert game2 == game and game2.active.pool == game.active.pool
+    assert game2.active.life == -40000
+
+    print("      ...done, %0.2f sec" % (time.perf_counter() - start_clock))
+
+    # -----------------------------------------------------------------------
+
+    print("Testing memory of slotted objects...")
+    start_clock = time.perf_counter()
+
+    game = GameState(1)
+    game.give_to(Cardboard(Decklist.Roots()), Zone.Field)
+    game.give_to(Cardboard(Decklist.Arcades()), Zone.Field)
+    roots = game.active.field[1]
+    caster = roots.get_activated()[0].valid_caster(game, 0, roots)
+    game.stack.append(Stack.StackAbility(0, roots.get_activated()[0],
+                                         caster, caster))
+    samples = [roots, roots.zone, caster, game.stack[0], game.trig_event[0]]
+    for obj in samples:
+        assert not hasattr(obj, "__dict__")
+    # the clone path must keep the sub-class and all the fields
+    zone2 = roots.zone.copy()
+    assert type(zone2) is Zone.Field and zone2.player == 0
+    caster2 = caster.copy()
+    assert type(caster2) is Verbs.PlayManaAbility
+    assert caster2.get_id() == caster.get_id()
+    obj2 = game.stack[0].copy()
+    assert type(obj2) is Stack.StackAbility
+    assert obj2.is_equiv_to(game.stack[0])
+    # slotted objects still pickle (needed by multiprocessing workers)
+    assert pickle.loads(pickle.dumps(caster)).get_id() == caster.get_id()
+
+    def bytes_each(make, num=2000) -> float:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        kept = [make() for _ in range(num)]
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        assert len(kept) == num
+        return used / num
+
+    for obj in samples:
+        slot_names = [n for c in type(obj).__mro__
+                      for n in c.__dict__.get("__slots__", ())]
+
+        class Loose:
+            """Same fields as the sampled object, but in a __dict__"""
+            def __init__(self, source):
+                for name in slot_names:
+                    setattr(self, name, getattr(source, name))
+
+        slotted = bytes_each(lambda: object.__new__(type(obj)))
+        loose = bytes_each(lambda: Loose(obj))
+        print("      %s: %i vs %i bytes" % (type(obj).__name__, slotted,
+                                             loose))
+        assert slotted < loose
+
+    print("      ...done, %0.2f sec" % (time.perf_counter() - start_clock))
+
     print("\n\npasses all tests!")
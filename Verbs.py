@@ -53,6 +53,12 @@ class Verb:
             to trigger.
     """
 
+    # Verbs are built and copied by the thousand while searching the game
+    # tree, so they skip the per-instance __dict__. Subclasses must also
+    # declare __slots__ (usually empty).
+    __slots__ = ("num_inputs", "copies", "_source", "_player", "_cause",
+                 "_subject", "_sub_verbs", "_inputs", "is_populated")
+
     def __init__(self, num_inputs: int, copies: bool):
         self.num_inputs: int = num_inputs
         self.copies: bool = copies  # returns copies of GameStates, not mutate.
@@ -97,7 +103,10 @@ class Verb:
         Otherwise, the new copy will have the same pointers as
         the old copy.
         """
-        new_verb = Verb(self.num_inputs, self.copies)
+        # build the sub-class directly, skipping its __init__
+        new_verb = self.__class__.__new__(self.__class__)
+        new_verb.num_inputs = self.num_inputs
+        new_verb.copies = self.copies
         if state_new is None:
             new_verb._source = self._source
             new_verb._cause = self._cause
@@ -118,7 +127,6 @@ class Verb:
         new_verb._sub_verbs = [v.copy(state_new) for v in self._sub_verbs]
         new_verb._player = self._player  # None and int are both atomic
         new_verb.is_populated = self.is_populated
-        new_verb.__class__ = self.__class__  # set the sub-class type directly
         return new_verb
 
     def replace_verb(self: V, index: int, new_verb: Verb) -> V:
@@ -224,14 +232,19 @@ class Verb:
         # Before calling the verb's private `_do_it` function, need to check
         # for any relevant replacement effects that would modify the verb
         iterate_verb = self
-        for holder in state.statics + state.statics_to_remove:
+        holders = state.get_static_holders(self)
+        while len(holders) > 0:
+            pos, holder = holders.pop(0)
             if holder.is_applicable(iterate_verb, state):
                 iterate_verb = holder.get_new_value(iterate_verb, state,
                                                     iterate_verb.player,
                                                     iterate_verb.source)
+                # the Verb may have changed type, so look again at the rest
+                holders = state.get_static_holders(iterate_verb, pos)
         # now perform the verb!
         accumulator: List[RESULT] = []
         for state2, verb2, track2 in iterate_verb._do_it(state, to_track):
+            state2.generation += 1  # anything might have changed
             verb2._add_self_to_state_history(state2)
             if check_triggers:
                 accumulator.append(verb2._check_triggers(state2, track2))
@@ -260,7 +273,7 @@ class Verb:
         # `trigger_source` is the card which owns the triggered ability which
         # might be triggering. Not to be confused with `subject`, which is the
         # cause of the Verb which is potentially CAUSING the trigger.
-        for holder in state.trig_event + state.trigs_to_remove:
+        for holder in state.get_trigger_holders(self):
             # add any abilities that trigger to the super_stack
             holder.apply_if_applicable(self, state)
         for v in self.sub_verbs:
@@ -311,6 +324,7 @@ if TYPE_CHECKING:
 
 
 class MultiVerb(Verb):
+    __slots__ = ()
 
     def __init__(self, list_of_verbs: List[Verb]):
         super().__init__(0, any([v.copies for v in list_of_verbs]))
@@ -404,6 +418,8 @@ class VerbFactory(Verb):
     MultiVerb once those are chosen. This isn't a subclass of
     MultiVerb, it just returns them during `populate_options`."""
 
+    __slots__ = ()
+
     class ShouldNeverBeRunError(Exception):
         pass
 
@@ -429,6 +445,8 @@ class AffectPlayer(Verb):
      the affected card is the controller of the Verb, but
      this can be overwritten."""
 
+    __slots__ = ()
+
     def __init__(self, num_inputs=0, copies=False):
         super().__init__(num_inputs, copies)  # mutates, doesn't copy
 
@@ -464,6 +482,8 @@ class AffectCard(Verb):
      the affected card is the source of the Verb, but
      this can be overwritten."""
 
+    __slots__ = ()
+
     def __init__(self, num_inputs=0, copies=False):
         super().__init__(num_inputs, copies)  # mutates, doesn't copy
 
@@ -492,6 +512,8 @@ class AffectStack(Verb):
     StackObject must be passed in as an additional option
     to `populate_options`, or set manually by the user."""
 
+    __slots__ = ()
+
     def __init__(self, num_inputs=0, copies=False):
         super().__init__(num_inputs, copies)  # mutates, doesn't copy
 
@@ -525,6 +547,8 @@ class ApplyToTargets(VerbFactory):
     the sub-verb is applied to all the targets in turn.
     """
 
+    __slots__ = ()
+
     def __init__(self, subject_chooser: Get.AllWhich,
                  option_getter: (Get.CardListFrom | Get.PlayerList
                                  | Get.StackList),
@@ -577,6 +601,8 @@ class Modal(VerbFactory):
     """Choose between various Verbs. Mode is chosen at
     cast-time, not on resolution."""
 
+    __slots__ = ()
+
     def __init__(self, list_of_verbs: List[Verb],
                  num_to_choose: Get.GetInteger | int = 1, can_be_less=False):
         super().__init__(2, any([v.copies for v in list_of_verbs]))
@@ -628,6 +654,8 @@ class Defer(Verb):
     be chosen only on resolution.
     """
 
+    __slots__ = ()
+
     # TODO make this a decorator or abstract class to inherit from?
 
     def __init__(self, verb: Verb):
@@ -661,7 +689,9 @@ class Defer(Verb):
                 results += subverb.do_it(state, to_track, False)
             else:
                 # I need to do the copying manually, to avoid mutating `state`
-                state2, things2 = state.copy_and_track([subverb] + to_track)
+                # (unless `state` is in in_place_mode and there's no choice)
+                state2, things2 = state.copy_or_reuse([subverb] + to_track,
+                                                      len(populated))
                 subverb2: Verb = things2[0]
                 to_track2 = things2[1:]
                 results += subverb2.do_it(state2, to_track2, False)
@@ -680,6 +710,8 @@ class Defer(Verb):
 
 
 class VerbManyTimes(VerbFactory):
+    __slots__ = ()
+
     def __init__(self, verb: Verb, num_to_repeat: Get.GetInteger | int):
         """The number of times to repeat the verb is chosen on casting"""
         super().__init__(1, verb.copies)
@@ -711,6 +743,8 @@ class LookDoThenDo(VerbFactory):
     As usual, selection is made at cast-time and should be wrapped
     in a Defer if resolution-time is desired (as it usually is)."""
 
+    __slots__ = ()
+
     def __init__(self, look_at: Get.CardListFrom, choose: Get.AllWhich,
                  do_to_chosen: AffectCard,
                  do_to_others: AffectCard):
@@ -766,6 +800,8 @@ class LookDoThenDo(VerbFactory):
 class NullVerb(Verb):
     """This Verb does literally nothing, ever."""
 
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(0, True)
 
@@ -801,6 +837,8 @@ class SingleGetterInput(Verb):
     that value for the populated Verb.
     """
 
+    __slots__ = ()
+
     def populate_options(self, state, player, source, cause) -> List[Verb]:
         [base] = super().populate_options(state, player, source, cause)
         if isinstance(base.inputs[0], Get.Getter):
@@ -817,22 +855,39 @@ class PayMana(AffectPlayer, SingleGetterInput):
     """deducts the given amount of mana from the
     subject Player's mana pool."""
 
+    __slots__ = ()
+
     def __init__(self, mana_string: Get.GetString | str):
         """If mana_string is a getter, it is evaluated during populate"""
         super().__init__(1)
         self._inputs = [mana_string]
 
+    def populate_options(self, state, player, source, cause
+                         ) -> List[PayMana]:
+        """One option for each meaningfully different way to pay
+        from the player's current mana pool. Each option's input
+        says exactly which mana to spend."""
+        options = []
+        for base in super().populate_options(state, player, source, cause):
+            pool = state.player_list[base.subject].pool
+            payments = pool.get_payments(base.inputs[0])
+            if len(payments) == 0:
+                options.append(base)  # can't pay. can_be_done will say so
+            else:
+                options += [base.replace_input(0, pay) for pay in payments]
+        return options
+
     def can_be_done(self, state: GameState) -> bool:
         if not super().can_be_done(state):
             return False
         mana_str = self.inputs[0]
         pool = state.player_list[self.subject].pool
-        return pool.can_afford_mana_cost(ManaHandler.ManaCost(mana_str))
+        return pool.can_afford_mana_cost(mana_str)
 
     def _do_it(self: V, state: GameState, to_track: list = []) -> List[RESULT]:
         mana_str = self.inputs[0]
         pool = state.player_list[self.subject].pool
-        pool.pay_mana_cost(ManaHandler.ManaCost(mana_str))
+        pool.pay_mana_cost(mana_str)
         return [(state, self, to_track)]
 
     def __str__(self):
@@ -848,6 +903,8 @@ class PayMana(AffectPlayer, SingleGetterInput):
 class AddMana(AffectPlayer, SingleGetterInput):
     """adds the given amount of mana to the player's mana pool"""
 
+    __slots__ = ()
+
     def __init__(self, mana_string: Get.GetString | str):
         """If mana_string is a getter, it is evaluated during populate"""
         super().__init__(1)
@@ -856,7 +913,7 @@ class AddMana(AffectPlayer, SingleGetterInput):
     def _do_it(self: V, state: GameState, to_track: list = []) -> List[RESULT]:
         mana_str = self.inputs[0]
         pool = state.player_list[self.subject].pool
-        pool.add_mana(ManaHandler.ManaPool(mana_str))
+        pool.add_mana(mana_str)
         return [(state, self, to_track)]
 
     def _add_self_to_state_history(self, state):
@@ -867,6 +924,8 @@ class AddMana(AffectPlayer, SingleGetterInput):
 
 
 class LoseLife(AffectPlayer, SingleGetterInput):
+    __slots__ = ()
+
     def __init__(self, damage_getter: Get.GetInteger | int):
         """The subject player loses the given amount of life. If
         damage_getter is a getter, it is evaluated during populate"""
@@ -884,6 +943,8 @@ class LoseLife(AffectPlayer, SingleGetterInput):
 
 
 class GainLife(AffectPlayer, SingleGetterInput):
+    __slots__ = ()
+
     def __init__(self, amount_getter: Get.GetInteger | int):
         """The subject player gains the given amount of life. If
         amount_getter is a getter, it is evaluated during populate"""
@@ -904,6 +965,8 @@ class DamageToPlayer(LoseLife):
     """The subject player is dealt the given amount of damage
         by the source."""
 
+    __slots__ = ()
+
     def _do_it(self: V, state: GameState, to_track: list = []) -> List[RESULT]:
         # make the source's controller gain life if source has lifelink
         if "lifelink" in Get.Keywords().get(state, self.source.player_index,
@@ -933,6 +996,8 @@ class PayLife(LoseLife):
     """The subject player pays the given amount of life.
     Cannot be done if they don't have enough life to pay."""
 
+    __slots__ = ()
+
     def can_be_done(self, state: GameState) -> bool:
         return (super().can_be_done(state) and
                 state.player_list[self.subject].life >= self.inputs[0])
@@ -944,6 +1009,7 @@ class PayLife(LoseLife):
 
 
 class LoseTheGame(AffectPlayer):
+    __slots__ = ()
 
     def _do_it(self: V, state: GameState, to_track: list = []) -> List[RESULT]:
         state.player_list[self.subject].victory_status = "L"
@@ -966,6 +1032,7 @@ class LoseTheGame(AffectPlayer):
 
 
 class WinTheGame(AffectPlayer):
+    __slots__ = ()
 
     def _do_it(self: V, state: GameState, to_track: list = []) -> List[RESULT]:
         state.player_list[self.subject].victory_status = "W"
@@ -989,6 +1056,8 @@ class WinTheGame(AffectPlayer):
 class Tap(AffectCard):
     """taps the source card if it was not already tapped."""
 
+    __slots__ = ()
+
     def can_be_done(self, state: GameState) -> bool:
         return (super().can_be_done(state)
                 and self.subject.is_in(Zone.Field)
@@ -999,10 +1068,13 @@ class Tap(AffectCard):
         # maintain the sorting in the subject's zone for new changed card id
         assert self.subject.is_in(Zone.Field)
         state.player_list[self.subject.player_index].re_sort_field()
+        state.rehash_card(self.subject)
         return [(state, self, to_track)]
 
 
 class Untap(AffectCard):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
@@ -1016,12 +1088,15 @@ class Untap(AffectCard):
         # maintain the sorting in the subject's zone for new changed card id
         assert self.subject.is_in(Zone.Field)
         state.player_list[self.subject.player_index].re_sort_field()
+        state.rehash_card(self.subject)
         return [(state, self, to_track)]
 
 
 class TapSymbol(Tap):
     """{T}. `subject` gets tapped if it's not a summoning-sick creature"""
 
+    __slots__ = ()
+
     def can_be_done(self, state: GameState) -> bool:
         return (super().can_be_done(state)
                 and Get.CanTapSymbol().get(state, self.player, self.subject))
@@ -1033,6 +1108,8 @@ class TapSymbol(Tap):
 class AddCounter(AffectCard):
     """Adds the given counter string to the subject card"""
 
+    __slots__ = ()
+
     def __init__(self, counter_text: str):
         super().__init__(1)
         self._inputs = [counter_text]
@@ -1050,6 +1127,7 @@ class AddCounter(AffectCard):
         # maintain the sorting in the subject's zone for new changed card id
         assert self.subject.is_in(Zone.Field)
         state.player_list[self.subject.player_index].re_sort_field()
+        state.rehash_card(self.subject)
         return [(state, self, to_track)]
 
     def _add_self_to_state_history(self, state: GameState):
@@ -1063,6 +1141,8 @@ class ActivateOncePerTurn(AffectCard):
     """Marks the given `subject` as only able to activate this ability once
     per turn"""
 
+    __slots__ = ()
+
     def __init__(self, ability_name: str):
         super().__init__(1)
         self._inputs = ["@" + ability_name]  # "@" is invisible counter
@@ -1081,6 +1161,7 @@ class ActivateOncePerTurn(AffectCard):
         # maintain the sorting in the subject's zone for new changed card id
         assert self.subject.is_in(Zone.Field)
         state.player_list[self.subject.player_index].re_sort_field()
+        state.rehash_card(self.subject)
         return [(state, self, to_track)]
 
     def _add_self_to_state_history(self, state):
@@ -1092,6 +1173,8 @@ class ActivateOnlyAsSorcery(Verb):
      of this Verb has priority. Otherwise, `can_be_done`
      will return False."""
 
+    __slots__ = ()
+
     def can_be_done(self, state: GameState) -> bool:
         return (super().can_be_done(state)
                 and len(state.stack) == 0 and len(state.super_stack) == 0
@@ -1128,6 +1211,8 @@ class ActivateOnlyAsSorcery(Verb):
 class Shuffle(AffectPlayer):
     """Shuffles the deck of given player."""
 
+    __slots__ = ()
+
     def _do_it(self: V, state: GameState, to_track: list = []) -> List[RESULT]:
         """Mutates. Reorder deck randomly."""
         random.shuffle(state.player_list[self.subject].deck)
@@ -1153,6 +1238,8 @@ class MoveToZone(AffectCard):
     know to do the rest.
     """
 
+    __slots__ = ()
+
     def __init__(self, destination_zone: Zone.Zone):
         super().__init__(2)
         self._inputs = [destination_zone, None]
@@ -1195,6 +1282,7 @@ class MoveToZone(AffectCard):
         # add to destination. (also resets subject's zone to be destination.)
         dest.add_to_zone(state, self.subject)
         self.subject.reset_to_default_cardboard()
+        state.rehash_card(self.subject)
         # add the origin and destination to inputs. necessary for checking.
         new_self = self.replace_input(0, dest)
         new_self = new_self.replace_input(1, origin)
@@ -1218,6 +1306,8 @@ class MoveToZone(AffectCard):
 class DrawCard(AffectPlayer):
     """The subject player draws from the top (index -1) of the deck"""
 
+    __slots__ = ()
+
     # Note: even if the deck is empty, you CAN draw. you'll just lose.
 
     def _do_it(self: V, state: GameState, to_track: list = []) -> List[RESULT]:
@@ -1240,6 +1330,8 @@ class DrawCard(AffectPlayer):
 
 
 class DiscardCard(MoveToZone):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(Zone.Grave(Get.Owners()))
 
@@ -1256,6 +1348,8 @@ class MarkAsPlayedLand(AffectPlayer):
     gamestate to say that the subjectn player has already
     played a land this turn"""
 
+    __slots__ = ()
+
     def can_be_done(self, state: GameState) -> bool:
         return (super().can_be_done(state)
                 and state.player_list[self.subject].land_drops_left > 0)
@@ -1269,6 +1363,8 @@ class MarkAsPlayedLand(AffectPlayer):
 
 
 class Sacrifice(MoveToZone):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(Zone.Grave(Get.Owners()))
 
@@ -1281,6 +1377,8 @@ class Sacrifice(MoveToZone):
 
 
 class Destroy(MoveToZone):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(Zone.Grave(Get.Owners()))
 
@@ -1312,6 +1410,8 @@ class SearchDeck(VerbFactory):
     into `populate_options`.
     """
 
+    __slots__ = ()
+
     def __init__(self, zone_to_move_to: Zone.Zone, num_to_find: int,
                  pattern: Match2.Pattern):
         super().__init__(3, True)
@@ -1361,6 +1461,8 @@ class UniversalCaster(AffectStack):
     instantly removes the thing from the stack.
     """
 
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(0, copies=True)
 
@@ -1414,7 +1516,9 @@ class UniversalCaster(AffectStack):
                 # make new caster object with this stack_object attached
                 self_new = self.replace_subject(stack_obj)
                 # 601.2a: add the spell to the stack
-                state2, track2 = state.copy_and_track([self_new] + to_track)
+                state2, track2 = state.copy_or_reuse([self_new] + to_track,
+                                                     len(payments)
+                                                     * len(effects))
                 self2 = track2[0]
                 obj2: StackObject = self2.subject
                 self._add_to_stack(state2, obj2)  # static method
@@ -1470,12 +1574,43 @@ class UniversalCaster(AffectStack):
 
 
 class PlayAbility(UniversalCaster):
+    __slots__ = ()
 
     def __str__(self):
         return "Activate " + str(self.subject.name)
 
 
 class PlayManaAbility(PlayAbility):
+    __slots__ = ()
+
+    def get_commute_key(self, state: GameState) -> str | None:
+        """
+        If activating this mana ability commutes with activating
+            any other such mana ability (on a different source),
+            returns a key for sorting them. Otherwise, None.
+        Commutes means: the cost affects only the source card
+            (tap it, put counters on it, etc.), the effect only
+            adds mana, and nothing in the GameState could trigger
+            from any of it. Then doing A and then B reaches the
+            same GameState as doing B and then A, so a search only
+            needs to try them in sorted order.
+        """
+        ability = self.subject.obj
+        cost = ability.cost
+        if cost.base_mana_cost is not None:
+            return None
+        if not all([isinstance(v, AffectCard) for v in cost.additional]):
+            return None  # cost might affect other cards (like Caretaker)
+        if type(ability.effect) is not AddMana:
+            return None
+        verb_types = ([type(self), AddMana, MultiVerb]
+                      + [type(v) for v in cost.additional])
+        for holder in state.trig_event + state.trigs_to_remove:
+            if any([issubclass(t, holder.target.verb_type)
+                    for t in verb_types]):
+                return None  # might trigger something
+        return self.source.get_id() + "|" + ability.name
+
     def _remove_if_needed(self, game: GameState, to_track: list
                           ) -> List[RESULT]:
         """If the thing we just put on the stack is supposed to
@@ -1503,6 +1638,26 @@ class PlayManaAbility(PlayAbility):
 
 
 class AddTriggeredAbility(UniversalCaster):
+    __slots__ = ()
+
+    def get_interchange_key(self) -> str:
+        """
+        Triggers with the same key are interchangeable: it makes
+            no difference which of them goes onto the stack first.
+        If the effect makes no choices and only affects the
+            controller (draw a card, gain 1 life, etc.), then the
+            key is just the effect, so triggers from different
+            sources can still match. Otherwise, the key is the id
+            of the trigger itself, so only triggers from equivalent
+            sources match.
+        """
+        effect = self.subject.obj.effect
+        if (isinstance(effect, AffectPlayer)
+                and not isinstance(effect, VerbFactory)
+                and not any([isinstance(i, Get.Getter)
+                             for i in effect.inputs])):
+            return "%i|%s" % (self.player, effect.get_id())
+        return self.get_id()
 
     def _do_it(self: V, state: GameState, to_track: list = []) -> List[RESULT]:
         """Put the StackObject onto the stack. Bypass the
@@ -1527,7 +1682,8 @@ class AddTriggeredAbility(UniversalCaster):
                                            obj=trig.obj,
                                            pay_cost=None,
                                            do_effect=do_effect)
-            state2, things = state.copy_and_track([stack_obj, self] + to_track)
+            state2, things = state.copy_or_reuse([stack_obj, self] + to_track,
+                                                 len(effects))
             state2.add_to_stack(things[0])  # copy of stack_obj
             self2: AddTriggeredAbility = things[1]
             # 601.2i: ability has now "been activated".
@@ -1544,6 +1700,8 @@ class AddTriggeredAbility(UniversalCaster):
 
 
 class AddAsEntersAbility(AddTriggeredAbility):
+    __slots__ = ()
+
     def _remove_if_needed(self, game: GameState, to_track: list
                           ) -> List[RESULT]:
         """If the thing we just put on the stack is supposed to
@@ -1573,6 +1731,7 @@ class AddAsEntersAbility(AddTriggeredAbility):
 # ----------
 
 class PlayCardboard(UniversalCaster):
+    __slots__ = ()
 
     def __str__(self):
         return "Cast " + str(self.subject.name)
@@ -1588,8 +1747,37 @@ class PlayCardboard(UniversalCaster):
         game.add_to_stack(obj)
 
 
+# ----------
+class AutoTapCast(MultiVerb):
+    """
+    Activates some mana abilities and then casts a card, all as
+    a single action. For pilots which `auto_tap` (see
+    Player.get_auto_tap_plans). The inputs are the creatures
+    which the mana abilities should tap as part of their costs,
+    like Caretaker's. Outcomes which tapped something else are
+    dropped, since other plans cover those.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, mana_casters: List[PlayManaAbility],
+                 caster: PlayCardboard, to_tap: List[Cardboard]):
+        super().__init__(mana_casters + [caster])
+        self.num_inputs = len(to_tap)
+        self._inputs = to_tap
+
+    def _do_it(self: V, state: GameState, to_track: list = []) -> List[RESULT]:
+        return [(state2, multi, track2)
+                for state2, multi, track2 in super()._do_it(state, to_track)
+                if all([card.tapped for card in multi.inputs])]
+
+    def __str__(self):
+        return " + ".join([str(v) for v in self.sub_verbs])
+
+
 # ----------
 class PlayLand(PlayCardboard):
+    __slots__ = ()
 
     def __str__(self):
         return "Play " + str(self.subject.name)
@@ -1619,6 +1807,8 @@ class PlayLand(PlayCardboard):
 
 # ----------
 class PlaySorcery(PlayCardboard):
+    __slots__ = ()
+
     def can_be_done(self, state: GameState) -> bool:
         doable = super().can_be_done(state)
         stack_empty = len(state.stack) == 0
@@ -1630,6 +1820,8 @@ class PlaySorcery(PlayCardboard):
 
 # ----------
 class PlayPermanent(PlayCardboard):
+    __slots__ = ()
+
     def can_be_done(self, state: GameState) -> bool:
         doable = super().can_be_done(state)
         stack_empty = len(state.stack) == 0
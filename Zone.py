@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import types
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, List, Sequence
 
 if TYPE_CHECKING:
     from GameState import GameState, Player
@@ -11,6 +11,14 @@ if TYPE_CHECKING:
 
 
 class Zone:
+    # name of the Player's zone list, if the Player keeps an index of
+    # equivalent cards and aggregate counts for it (see `Player.get_groups`
+    # and `Player.aggregates`). Else None.
+    _group_name: str | None = None
+
+    # no per-instance __dict__: every Cardboard carries a Zone. Subclasses
+    # must also declare (empty) __slots__.
+    __slots__ = ("player", "location")
 
     class RelativeError(Exception):
         pass
@@ -48,6 +56,12 @@ class Zone:
         """Return a reference to the correct zone."""
         raise Exception
 
+    def _peek_whole_zone_list(self, player: Player
+                              ) -> Sequence[Cardboard | StackObject]:
+        """Like `_get_whole_zone_list`, but the caller promises not
+        to mutate the zone or anything in it."""
+        return self._get_whole_zone_list(player)
+
     def get(self, state: GameState) -> List[StackObject | Cardboard]:
         """Get the list of objects which exist in this zone
         in the given GameState. If nothing exists in the
@@ -55,12 +69,23 @@ class Zone:
         The Zone MUST be absolute in order for this function
         to work! If it is relative, raises RelativeError.
         """
+        return self._get_from(state, self._get_whole_zone_list)
+
+    def peek(self, state: GameState) -> Sequence[StackObject | Cardboard]:
+        """Like `get`, but only for callers which read the objects
+        and never mutate them (or the returned sequence). Players
+        can then skip any copy-on-write they'd need before handing
+        out something mutable (see `Player.deck_view`)."""
+        return self._get_from(state, self._peek_whole_zone_list)
+
+    def _get_from(self, state: GameState, whole_zone_getter
+                  ) -> Sequence[StackObject | Cardboard]:
         if not self.is_fixed:
             raise Zone.RelativeError
         if isinstance(self.player, int):
             # single player. grab it and return it
             pl = state.player_list[self.player]
-            whole_zone = self._get_whole_zone_list(pl)
+            whole_zone = whole_zone_getter(pl)
             if self.location is None or len(whole_zone) == 0:
                 return whole_zone
             elif isinstance(self.location, int):
@@ -75,17 +100,54 @@ class Zone:
                 # "recurse" by defining a new temporary Zone object
                 temp_zone = self.copy()
                 temp_zone.player = ii
-                acc += temp_zone.get(state)
+                acc += temp_zone._get_from(state, whole_zone_getter)
             return acc
 
+    def get_groups(self, state: GameState
+                   ) -> List[List[StackObject | Cardboard]]:
+        """Like `get`, but with equivalent objects grouped
+        together, so that anything which only depends on what
+        an object IS (not which object it is) can be checked once
+        per group. Zones which the Player doesn't keep grouped
+        just put each object in its own group.
+        The Zone MUST be absolute, same as for `get`."""
+        if self._group_name is None or self.location is not None:
+            return [[obj] for obj in self.peek(state)]
+        if not self.is_fixed:
+            raise Zone.RelativeError
+        if isinstance(self.player, int):
+            players = [state.player_list[self.player]]
+        else:  # look at all players
+            players = state.player_list
+        return [group for pl in players
+                for group in pl.get_groups(self._group_name).values()]
+
+    def get_aggregate(self, state: GameState, key: tuple) -> int | None:
+        """How many cards in this zone are counted under the given
+        key of `Player.aggregates`, without looking at each card.
+        Returns None for zones which the Player doesn't keep
+        aggregates for.
+        The Zone MUST be absolute, same as for `get`."""
+        if self._group_name is None or self.location is not None:
+            return None
+        if not self.is_fixed:
+            raise Zone.RelativeError
+        if isinstance(self.player, int):
+            players = [state.player_list[self.player]]
+        else:  # look at all players
+            players = state.player_list
+        return sum([pl.aggregates[self._group_name][key] for pl in players])
+
     def __str__(self):
         text = type(self).__name__
         text += str(self.player) if self.player is not None else ""
         return text
 
     def copy(self, *args):
-        new_zone = Zone(self.player, self.location)
-        new_zone.__class__ = self.__class__  # set the class type directly
+        # build the sub-class directly, skipping its __init__
+        new_zone = self.__class__.__new__(self.__class__)
+        new_zone.player = self.player
+        new_zone.location = self.location
         return new_zone
 
     def get_absolute_zones(self, state: GameState, asking_player: int,
@@ -154,6 +216,8 @@ class Zone:
 
 
 class Deck(Zone):
+    __slots__ = ()
+
     # index -1 is the top of the deck. Index 0 is the bottom.
     def __init__(self, player: int | None | Getters.PlayerList, location=None):
         super().__init__(player, location)
@@ -161,6 +225,9 @@ class Deck(Zone):
     def _get_whole_zone_list(self, player: Player) -> List[Cardboard]:
         return player.deck
 
+    def _peek_whole_zone_list(self, player: Player) -> Sequence[Cardboard]:
+        return player.deck_view
+
     def add_to_zone(self, state: GameState, card: Cardboard):
         if not self.is_single:
             raise Zone.NotSpecificPlayerError
@@ -188,24 +255,34 @@ class Deck(Zone):
 
 
 class DeckBottom(Deck):
+    __slots__ = ()
+
     # index -1 is the top of the deck. Index 0 is the bottom.
     def __init__(self, player: int | None | Getters.PlayerList):
         super().__init__(player, 0)
 
 
 class DeckTop(Deck):
+    __slots__ = ()
+
     # index -1 is the top of the deck. Index 0 is the bottom.
     def __init__(self, player: int | None | Getters.PlayerList):
         super().__init__(player, -1)
 
 
 class DeckTopN(Deck):
+    __slots__ = ()
+
     # index -1 is the top of the deck. Index 0 is the bottom.
     def __init__(self, player, depth: int):
         super().__init__(player, slice(-1*depth, None, None))
 
 
 class Hand(Zone):
+    __slots__ = ()
+
+    _group_name = "hand"
+
     def __init__(self, player: int | None | Getters.PlayerList):
         super().__init__(player, None)  # hand resorts itself, so no location
 
@@ -235,6 +312,10 @@ class Hand(Zone):
 
 
 class Field(Zone):
+    __slots__ = ()
+
+    _group_name = "field"
+
     def __init__(self, player: int | None | Getters.PlayerList):
         super().__init__(player, None)  # field resorts itself, so no location
 
@@ -264,6 +345,10 @@ class Field(Zone):
 
 
 class Grave(Zone):
+    __slots__ = ()
+
+    _group_name = "grave"
+
     def __init__(self, player: int | None | Getters.PlayerList):
         super().__init__(player, None)  # grave is not ordered
 
@@ -293,6 +378,8 @@ class Grave(Zone):
 
 
 class Stack(Zone):
+    __slots__ = ()
+
     def __init__(self, location=None):
         super().__init__(None, location)  # stack is shared. Zone tracks order.
 
@@ -317,6 +404,9 @@ class Stack(Zone):
         else:  # slice
             return state.stack[self.location]
 
+    def peek(self, state: GameState) -> Sequence[StackObject | Cardboard]:
+        return self.get(state)
+
     def add_to_zone(self, state: GameState, card: Cardboard):
         """Cardboard doesn't live on the stack, so just change
         the Cardboard's Zone without actually adding anything
@@ -331,6 +421,9 @@ class Stack(Zone):
 
 class Unknown(Zone):
     """For new cards which have not yet been given a home."""
+
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(None, None)
 